@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from app import crud, vector_categorizer
+from app.database import AsyncSessionLocal, init_models
+from app.urls import url_hash
+
+BACKFILL_CHECKPOINT_PATH = os.getenv("BACKFILL_CHECKPOINT_PATH", "backfill_checkpoint.json")
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "5000"))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "2"))
+BACKFILL_MAX_ROWS_PER_SECOND = float(os.getenv("BACKFILL_MAX_ROWS_PER_SECOND", "20000"))
+BACKFILL_PAUSE_SECONDS = float(os.getenv("BACKFILL_PAUSE_SECONDS", "0.05"))
+
+def classify_chunk(rows: List[Tuple[int, str, Optional[str], str]]) -> List[Tuple[int, str]]:
+    categories = vector_categorizer.categorize_batch(
+        [row[1] for row in rows],
+        [row[2] for row in rows]
+    )
+    return [
+        (row[0], category.value)
+        for row, category in zip(rows, categories)
+        if category.value != row[3]
+    ]
+
+def load_checkpoint(path: str = BACKFILL_CHECKPOINT_PATH) -> dict:
+    if not os.path.exists(path):
+        return {'last_id': 0, 'scanned': 0, 'updated': 0}
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+def save_checkpoint(checkpoint: dict, path: str = BACKFILL_CHECKPOINT_PATH):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, path)
+
+async def run_backfill(chunk_size: int = BACKFILL_CHUNK_SIZE, workers: int = BACKFILL_WORKERS,
+                       max_rows_per_second: float = BACKFILL_MAX_ROWS_PER_SECOND,
+                       pause_seconds: float = BACKFILL_PAUSE_SECONDS,
+                       checkpoint_path: str = BACKFILL_CHECKPOINT_PATH, reset: bool = False) -> dict:
+    checkpoint = {'last_id': 0, 'scanned': 0, 'updated': 0} if reset else load_checkpoint(checkpoint_path)
+    print(f"Recategorizing articles after id {checkpoint['last_id']}")
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    scanned_this_run = 0
+    pending = deque()
+    after_id = checkpoint['last_id']
+    exhausted = False
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < workers * 2:
+                async with AsyncSessionLocal() as db:
+                    rows = await crud.get_labeled_articles_chunk(db, after_id, chunk_size)
+                if not rows:
+                    exhausted = True
+                    break
+                after_id = rows[-1].id
+                chunk = [(row.id, row.title, row.summary, row.category.value) for row in rows if not row.corrected]
+                pending.append((after_id, len(rows), loop.run_in_executor(executor, classify_chunk, chunk)))
+
+            if not pending:
+                break
+            last_id, scanned, future = pending.popleft()
+            changes = await future
+            if changes:
+                async with AsyncSessionLocal() as db:
+                    await crud.bulk_update_article_categories(db, changes)
+
+            checkpoint['last_id'] = last_id
+            checkpoint['scanned'] += scanned
+            checkpoint['updated'] += len(changes)
+            save_checkpoint(checkpoint, checkpoint_path)
+            scanned_this_run += scanned
+            print(f"Checked up to id {last_id}: {checkpoint['scanned']} scanned, {checkpoint['updated']} updated")
+
+            delay = pause_seconds
+            if max_rows_per_second > 0:
+                delay = max(delay, scanned_this_run / max_rows_per_second - (time.perf_counter() - started))
+            await asyncio.sleep(delay)
+
+    elapsed = time.perf_counter() - started
+    print(f"Backfill finished in {elapsed:.1f}s: {checkpoint['scanned']} scanned, {checkpoint['updated']} updated")
+    return checkpoint
+
+async def backfill_url_hashes(chunk_size: int = BACKFILL_CHUNK_SIZE,
+                              pause_seconds: float = BACKFILL_PAUSE_SECONDS) -> int:
+    """Fills url_hash for articles saved before it existed.
+
+    A legacy row whose key already belongs to another article is a URL variant of it: it keeps
+    NULL and is linked through duplicate_of, so it drops out of the feeds like other copies.
+    """
+    await init_models()
+    filled = linked = 0
+    after_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = await crud.get_articles_without_url_hash(db, after_id, chunk_size)
+            if not rows:
+                break
+            after_id = rows[-1].id
+            keys = {row.id: url_hash(row.source_url) for row in rows}
+            owners = await crud.get_article_ids_by_url_hash(db, set(keys.values()))
+            changes, duplicates = [], []
+            for row in rows:
+                key = keys[row.id]
+                if key in owners:
+                    if row.duplicate_of is None:
+                        duplicates.append((row.id, owners[key]))
+                    continue
+                owners[key] = row.id
+                changes.append((row.id, key))
+            if changes or duplicates:
+                await crud.bulk_update_article_url_hashes(db, changes, duplicates)
+        filled += len(changes)
+        linked += len(duplicates)
+        print(f"Hashed URLs up to id {after_id}: {filled} filled, {linked} linked as duplicates")
+        await asyncio.sleep(pause_seconds)
+    return filled
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Recategorize stored articles with the current model")
+    arg_parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    arg_parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    arg_parser.add_argument("--max-rows-per-second", type=float, default=BACKFILL_MAX_ROWS_PER_SECOND,
+                            help="throttle; 0 disables the rate limit")
+    arg_parser.add_argument("--pause", type=float, default=BACKFILL_PAUSE_SECONDS,
+                            help="minimum pause between chunks, seconds")
+    arg_parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT_PATH)
+    arg_parser.add_argument("--reset", action="store_true", help="ignore the checkpoint and start from the first id")
+    arg_parser.add_argument("--url-hashes", action="store_true",
+                            help="fill url_hash for articles saved before it existed instead of recategorizing")
+    args = arg_parser.parse_args()
+    if args.url_hashes:
+        asyncio.run(backfill_url_hashes(args.chunk_size, args.pause))
+    else:
+        asyncio.run(run_backfill(args.chunk_size, args.workers, args.max_rows_per_second, args.pause,
+                                 args.checkpoint, args.reset))
@@ -0,0 +1,214 @@
+import json
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from app.models import ArticleCategory
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_CATEGORY_KEYWORDS = {
+    ArticleCategory.POLITICS: ['выборы', 'президент', 'правительство', 'политика', 'путин', 'депутат'],
+    ArticleCategory.TECHNOLOGY: ['технология', 'искусственный интеллект', 'стартап', 'гаджет',
+                                 'программирование', 'it', 'смартфон'],
+    ArticleCategory.SPORTS: ['футбол', 'хоккей', 'соревнование', 'олимпиада', 'спортсмен', 'чемпионат'],
+    ArticleCategory.BUSINESS: ['бизнес', 'экономика', 'рынок', 'акции', 'компания', 'финансы'],
+    ArticleCategory.ENTERTAINMENT: ['кино', 'сериал', 'музыка', 'знаменитость', 'концерт'],
+    ArticleCategory.SCIENCE: ['наука', 'исследование', 'открытие', 'ученый', 'космос'],
+    ArticleCategory.HEALTH: ['здоровье', 'медицина', 'врач', 'лекарство', 'болезнь']
+}
+
+CATEGORY_KEYWORDS_PATH = os.getenv("CATEGORY_KEYWORDS_PATH", "category_keywords.json")
+KEYWORDS_RELOAD_CHECK_SECONDS = float(os.getenv("KEYWORDS_RELOAD_CHECK_SECONDS", "30"))
+
+WORD_RE = re.compile(r"\w+")
+STEM_ENDINGS = frozenset("аеёиийоуыьэюя")
+STEM_MIN_LENGTH = 4
+STEM_MAX_STRIPPED = 2
+TOKEN_CACHE_SIZE = 200000
+
+def keyword_stem(word: str) -> Tuple[str, bool]:
+    """Returns (unit, exact): short keywords match whole tokens only, longer ones drop up to two
+    vowel endings and then match any token that starts with the stem."""
+    word = word.replace("ё", "е")
+    if len(word) < STEM_MIN_LENGTH:
+        return word, True
+    stripped = 0
+    while stripped < STEM_MAX_STRIPPED and len(word) > STEM_MIN_LENGTH and word[-1] in STEM_ENDINGS:
+        word = word[:-1]
+        stripped += 1
+    return word, False
+
+Keywords = Union[Iterable[str], Mapping[str, float]]
+
+class KeywordCategorizer:
+    def __init__(self, category_keywords: Mapping[ArticleCategory, Keywords], version: int = 0):
+        self.version = version
+        self.categories = tuple(ArticleCategory)
+        self.keyword_weights = {}
+        for category, keywords in category_keywords.items():
+            category = ArticleCategory(category)
+            weights = keywords.items() if isinstance(keywords, Mapping) else ((keyword, 1.0) for keyword in keywords)
+            for keyword, weight in weights:
+                keyword = " ".join(WORD_RE.findall(keyword.lower()))
+                if keyword and weight:
+                    self.keyword_weights.setdefault(keyword, {}).setdefault(category, float(weight))
+        self.keyword_categories = {
+            keyword: list(weights) for keyword, weights in self.keyword_weights.items()
+        }
+        self._keyword_indexes = {
+            keyword: tuple((self.categories.index(category), weight) for category, weight in weights.items())
+            for keyword, weights in self.keyword_weights.items()
+        }
+
+        self._exact_units = set()
+        self._stem_units = set()
+        self.keyword_units = {}
+        for keyword in self.keyword_categories:
+            units = []
+            for word in keyword.split(" "):
+                unit, exact = keyword_stem(word)
+                (self._exact_units if exact else self._stem_units).add(unit)
+                units.append(unit)
+            self.keyword_units[keyword] = tuple(units)
+        self._token_units = {}
+
+        self.words = {}
+        self.phrases = {}
+        for keyword, units in self.keyword_units.items():
+            if len(units) == 1:
+                self.words.setdefault(units[0], []).append(keyword)
+            else:
+                self.phrases.setdefault(units[0], []).append((units, keyword))
+        self._phrase_starts = frozenset(self.phrases)
+
+    def normalize_token(self, token: str) -> str:
+        """Maps a token to the longest keyword unit it matches, or returns it unchanged."""
+        unit = self._token_units.get(token)
+        if unit is not None:
+            return unit
+        unit = token.replace("ё", "е")
+        if unit not in self._exact_units:
+            for length in range(len(unit), STEM_MIN_LENGTH - 1, -1):
+                if unit[:length] in self._stem_units:
+                    unit = unit[:length]
+                    break
+        if len(self._token_units) >= TOKEN_CACHE_SIZE:
+            self._token_units.clear()
+        self._token_units[token] = unit
+        return unit
+
+    def match(self, text: str) -> Set[str]:
+        normalize_token = self.normalize_token
+        units = [normalize_token(token) for token in WORD_RE.findall(text.lower())]
+        matched = set()
+        for unit in set(units) & self.words.keys():
+            matched.update(self.words[unit])
+        if self._phrase_starts.isdisjoint(units):
+            return matched
+        for position, unit in enumerate(units):
+            for phrase, keyword in self.phrases.get(unit, ()):
+                if tuple(units[position:position + len(phrase)]) == phrase:
+                    matched.add(keyword)
+        return matched
+
+    def _counts(self, matched: Set[str]) -> List[float]:
+        counts = [0.0] * len(self.categories)
+        for keyword in matched:
+            for index, weight in self._keyword_indexes[keyword]:
+                counts[index] += weight
+        return counts
+
+    def scores(self, text: str) -> Dict[ArticleCategory, float]:
+        return dict(zip(self.categories, self._counts(self.match(text))))
+
+    def categorize(self, title: str, summary: Optional[str] = "") -> ArticleCategory:
+        matched = self.match(title + " " + (summary or "") if summary else title)
+        if not matched:
+            return ArticleCategory.GENERAL
+        counts = self._counts(matched)
+        best = max(counts)
+        if best <= 0:
+            return ArticleCategory.GENERAL
+        return self.categories[counts.index(best)]
+
+    def categorize_many(self, items: Iterable[Tuple[str, Optional[str]]]) -> List[ArticleCategory]:
+        categorize = self.categorize
+        return [categorize(title, summary) for title, summary in items]
+
+    def to_dict(self) -> Dict:
+        categories = {category.value: {} for category in self.categories}
+        for keyword, weights in self.keyword_weights.items():
+            for category, weight in weights.items():
+                categories[category.value][keyword] = weight
+        return {
+            'version': self.version,
+            'categories': {category: keywords for category, keywords in categories.items() if keywords}
+        }
+
+def load_categorizer(path: str = CATEGORY_KEYWORDS_PATH) -> KeywordCategorizer:
+    with open(path, encoding="utf-8") as keywords_file:
+        data = json.load(keywords_file)
+    return KeywordCategorizer(data['categories'], int(data.get('version', 0)))
+
+def save_categorizer(keyword_categorizer: KeywordCategorizer, path: str = CATEGORY_KEYWORDS_PATH):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as keywords_file:
+        json.dump(keyword_categorizer.to_dict(), keywords_file, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, path)
+
+default_categorizer = KeywordCategorizer(DEFAULT_CATEGORY_KEYWORDS)
+_keywords_mtime = None
+_checked_at = None
+
+def get_categorizer() -> KeywordCategorizer:
+    global default_categorizer, _keywords_mtime, _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < KEYWORDS_RELOAD_CHECK_SECONDS:
+        return default_categorizer
+    _checked_at = now
+    try:
+        mtime = os.stat(CATEGORY_KEYWORDS_PATH).st_mtime
+    except OSError:
+        return default_categorizer
+    if mtime != _keywords_mtime:
+        _keywords_mtime = mtime
+        try:
+            loaded = load_categorizer(CATEGORY_KEYWORDS_PATH)
+        except Exception as e:
+            print(f"Error loading category keywords {CATEGORY_KEYWORDS_PATH}: {e}")
+            return default_categorizer
+        if loaded.to_dict() != default_categorizer.to_dict():
+            default_categorizer = loaded
+            print(f"Loaded category keywords version {loaded.version} from {CATEGORY_KEYWORDS_PATH}")
+    return default_categorizer
+
+def set_categorizer(keyword_categorizer: KeywordCategorizer, path: str = CATEGORY_KEYWORDS_PATH):
+    global default_categorizer, _keywords_mtime, _checked_at
+    save_categorizer(keyword_categorizer, path)
+    default_categorizer = keyword_categorizer
+    _checked_at = time.monotonic()
+    if path == CATEGORY_KEYWORDS_PATH:
+        _keywords_mtime = os.stat(path).st_mtime
+
+class KeywordsVersionConflict(Exception):
+    def __init__(self, current_version: int):
+        super().__init__(f"category keywords are at version {current_version}")
+        self.current_version = current_version
+
+def update_categorizer(category_keywords: Mapping[ArticleCategory, Keywords], expected_version: Optional[int] = None,
+                       path: str = CATEGORY_KEYWORDS_PATH) -> KeywordCategorizer:
+    """Compare-and-swap against the file itself, so concurrent workers cannot both write the next version."""
+    with open(f"{path}.lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        current_version = load_categorizer(path).version if os.path.exists(path) else default_categorizer.version
+        if expected_version is not None and expected_version != current_version:
+            raise KeywordsVersionConflict(current_version)
+        updated = KeywordCategorizer(category_keywords, current_version + 1)
+        set_categorizer(updated, path)
+    return updated
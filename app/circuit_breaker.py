@@ -0,0 +1,42 @@
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+BREAKER_BASE_SECONDS = int(os.getenv("BREAKER_BASE_SECONDS", "60"))
+BREAKER_MAX_SECONDS = int(os.getenv("BREAKER_MAX_SECONDS", str(6 * 3600)))
+BREAKER_JITTER = float(os.getenv("BREAKER_JITTER", "0.2"))
+BREAKER_MAX_FAILURES = int(os.getenv("BREAKER_MAX_FAILURES", "20"))
+
+def as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def is_open(source, now: Optional[datetime] = None) -> bool:
+    if not source.retry_at:
+        return False
+    return as_utc(source.retry_at) > (now or datetime.now(timezone.utc))
+
+def failure_values(source, error: Exception, now: Optional[datetime] = None) -> Dict:
+    now = now or datetime.now(timezone.utc)
+    failures = (source.failure_count or 0) + 1
+    delay = min(BREAKER_BASE_SECONDS * 2 ** min(failures - 1, 30), BREAKER_MAX_SECONDS)
+    delay *= random.uniform(1 - BREAKER_JITTER, 1 + BREAKER_JITTER)
+    values = {
+        'failure_count': failures,
+        'retry_at': now + timedelta(seconds=delay),
+        'last_error': f"{type(error).__name__}: {error}"[:500]
+    }
+    if BREAKER_MAX_FAILURES and failures >= BREAKER_MAX_FAILURES:
+        values['is_active'] = False
+    return values
+
+def success_values(source) -> Dict:
+    if not source.failure_count and not source.retry_at:
+        return {}
+    return {'failure_count': 0, 'retry_at': None, 'last_error': None}
+
+def apply(source, values: Dict):
+    for key, value in values.items():
+        setattr(source, key, value)
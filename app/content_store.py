@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app import crud
+from app.database import AsyncSessionLocal, init_models
+
+CONTENT_COMPRESSION = os.getenv("CONTENT_COMPRESSION", "false").lower() == "true"
+CONTENT_DICTIONARY_DIR = os.getenv("CONTENT_DICTIONARY_DIR", "content_dictionaries")
+CONTENT_COMPRESSION_LEVEL = int(os.getenv("CONTENT_COMPRESSION_LEVEL", "6"))
+CONTENT_MIGRATION_BATCH_SIZE = int(os.getenv("CONTENT_MIGRATION_BATCH_SIZE", "500"))
+DICTIONARY_MAX_BYTES = 32768
+HEADER_BYTES = 4
+CURRENT_FILE = "current"
+SEGMENT_RE = re.compile(r"\S+\s*")
+
+_dictionaries: Dict[int, bytes] = {}
+_current_id = None
+
+def dictionary_id(dictionary: bytes) -> int:
+    return zlib.crc32(dictionary) if dictionary else 0
+
+def train_dictionary(samples: List[str], max_bytes: int = DICTIONARY_MAX_BYTES) -> bytes:
+    """Builds a zlib preset dictionary from the most valuable repeated one to three word sequences."""
+    counts = Counter()
+    for sample in samples:
+        segments = SEGMENT_RE.findall(sample)
+        for n in (1, 2, 3):
+            for start in range(len(segments) - n + 1):
+                counts["".join(segments[start:start + n])] += 1
+
+    scored = sorted(
+        ((count - 1) * len(segment.encode("utf-8")), segment)
+        for segment, count in counts.items() if count > 1
+    )
+    chosen, size = [], 0
+    for _, segment in reversed(scored):
+        encoded = segment.encode("utf-8")
+        if size + len(encoded) > max_bytes:
+            continue
+        chosen.append(encoded)
+        size += len(encoded)
+    # zlib reaches back from the end of the dictionary most cheaply, so the best segments go last
+    return b"".join(reversed(chosen))
+
+def save_dictionary(dictionary: bytes, directory: str = CONTENT_DICTIONARY_DIR) -> int:
+    global _current_id
+    os.makedirs(directory, exist_ok=True)
+    key = dictionary_id(dictionary)
+    with open(os.path.join(directory, f"{key:08x}.bin"), "wb") as dictionary_file:
+        dictionary_file.write(dictionary)
+    temporary_path = os.path.join(directory, f"{CURRENT_FILE}.tmp")
+    with open(temporary_path, "w") as current_file:
+        current_file.write(f"{key:08x}")
+    os.replace(temporary_path, os.path.join(directory, CURRENT_FILE))
+    _dictionaries[key] = dictionary
+    _current_id = key
+    return key
+
+def load_dictionary(key: int, directory: str = CONTENT_DICTIONARY_DIR) -> bytes:
+    if key not in _dictionaries:
+        if key == 0:
+            _dictionaries[key] = b""
+        else:
+            with open(os.path.join(directory, f"{key:08x}.bin"), "rb") as dictionary_file:
+                _dictionaries[key] = dictionary_file.read()
+    return _dictionaries[key]
+
+def current_dictionary(directory: str = CONTENT_DICTIONARY_DIR) -> bytes:
+    global _current_id
+    if _current_id is None:
+        current_path = os.path.join(directory, CURRENT_FILE)
+        if os.path.exists(current_path):
+            with open(current_path) as current_file:
+                _current_id = int(current_file.read().strip(), 16)
+        else:
+            _current_id = 0
+    return load_dictionary(_current_id, directory)
+
+def compress(text: str, dictionary: Optional[bytes] = None) -> bytes:
+    dictionary = current_dictionary() if dictionary is None else dictionary
+    compressor = zlib.compressobj(CONTENT_COMPRESSION_LEVEL, zdict=dictionary) if dictionary \
+        else zlib.compressobj(CONTENT_COMPRESSION_LEVEL)
+    body = compressor.compress(text.encode("utf-8")) + compressor.flush()
+    return dictionary_id(dictionary).to_bytes(HEADER_BYTES, "big") + body
+
+def decompress(blob: bytes) -> str:
+    dictionary = load_dictionary(int.from_bytes(blob[:HEADER_BYTES], "big"))
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return (decompressor.decompress(blob[HEADER_BYTES:]) + decompressor.flush()).decode("utf-8")
+
+def pack(article: Dict) -> Dict:
+    """Moves content into content_compressed when compressed storage is enabled."""
+    article['content_compressed'] = None
+    if CONTENT_COMPRESSION and article.get('content'):
+        article['content_compressed'] = compress(article['content'])
+        article['content'] = None
+    return article
+
+def article_content(article) -> Optional[str]:
+    if article.content_compressed is not None:
+        return decompress(article.content_compressed)
+    return article.content
+
+async def train(sample_size: int) -> int:
+    await init_models()
+    async with AsyncSessionLocal() as db:
+        samples = await crud.get_content_samples(db, sample_size)
+    dictionary = train_dictionary(samples)
+    key = save_dictionary(dictionary)
+    raw = sum(len(sample.encode("utf-8")) for sample in samples)
+    plain = sum(len(compress(sample, b"")) for sample in samples)
+    trained = sum(len(compress(sample, dictionary)) for sample in samples)
+    print(f"Trained dictionary {key:08x} ({len(dictionary)} bytes) on {len(samples)} articles: "
+          f"{raw} bytes -> {plain} without dictionary, {trained} with it")
+    return key
+
+async def migrate(batch_size: int = CONTENT_MIGRATION_BATCH_SIZE, expand: bool = False) -> int:
+    """Converts stored content in id order, committing every batch; expand reverses it."""
+    await init_models()
+    converted = 0
+    after_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = await crud.get_content_chunk(db, after_id, batch_size, compressed=expand)
+            if not rows:
+                break
+            after_id = rows[-1].id
+            if expand:
+                changes = [{'id': row.id, 'content': decompress(row.content_compressed), 'content_compressed': None}
+                           for row in rows]
+            else:
+                changes = [{'id': row.id, 'content': None, 'content_compressed': compress(row.content)}
+                           for row in rows]
+            await crud.bulk_update_article_content(db, changes)
+        converted += len(rows)
+        print(f"{'Expanded' if expand else 'Compressed'} {converted} articles (up to id {after_id})")
+    return converted
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Manage compressed article content")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train a shared dictionary on stored articles")
+    train_parser.add_argument("--samples", type=int, default=2000)
+    migrate_parser = commands.add_parser("migrate", help="compress stored content in batches")
+    migrate_parser.add_argument("--batch-size", type=int, default=CONTENT_MIGRATION_BATCH_SIZE)
+    migrate_parser.add_argument("--expand", action="store_true", help="decompress back into the content column")
+    args = arg_parser.parse_args()
+
+    if args.command == "train":
+        asyncio.run(train(args.samples))
+    else:
+        asyncio.run(migrate(args.batch_size, args.expand))
@@ -1,10 +1,18 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, or_, desc
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import select, insert, update, delete, func, or_, and_, desc
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 from fastapi import HTTPException
 from app import models
 from app.auth import get_password_hash
+from app.urls import canonicalize, url_hash
+import os
+
+ARTICLE_INSERT_BATCH_SIZE = int(os.getenv("ARTICLE_INSERT_BATCH_SIZE", "100"))
+ARTICLE_LIST_FIELDS = ("id", "title", "summary", "source_url", "image_url", "category", "source_id",
+                       "published_at", "created_at", "is_read")
+ARTICLE_CARD_FIELDS = ("id", "title", "summary", "image_url", "category", "published_at")
 
 async def get_user_by_email(db: AsyncSession, email: str):
     result = await db.execute(
@@ -50,7 +58,8 @@ async def create_article(db: AsyncSession, article):
             title=article_data.get('title', '')[:500],
             summary=article_data.get('summary', '')[:1000] if article_data.get('summary') else None,
             content=article_data.get('content', ''),
-            source_url=article_data.get('source_url', ''),
+            source_url=canonicalize(article_data.get('source_url', ''))[:500],
+            url_hash=url_hash(article_data.get('source_url', '')),
             image_url=article_data.get('image_url'),
             category=article_data.get('category'),
             source_id=article_data.get('source_id'),
@@ -64,6 +73,29 @@ async def create_article(db: AsyncSession, article):
         await db.rollback()
         raise
 
+async def bulk_insert_articles(db: AsyncSession, articles: List[dict], batch_size: int = ARTICLE_INSERT_BATCH_SIZE):
+    dialect = db.bind.dialect.name
+    inserted = []
+    for start in range(0, len(articles), batch_size):
+        batch = articles[start:start + batch_size]
+        try:
+            if dialect == "postgresql":
+                stmt = postgresql_insert(models.Article).values(batch).on_conflict_do_nothing()
+            else:
+                stmt = insert(models.Article).values(batch)
+                if dialect == "sqlite":
+                    stmt = stmt.prefix_with("OR IGNORE")
+            result = await db.execute(stmt.returning(models.Article.id, models.Article.source_url))
+            inserted.extend(result.all())
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    return inserted
+
+async def bulk_create_articles(db: AsyncSession, articles: List[dict], batch_size: int = ARTICLE_INSERT_BATCH_SIZE) -> int:
+    return len(await bulk_insert_articles(db, articles, batch_size))
+
 async def get_article(db: AsyncSession, article_id: int):
     result = await db.execute(
         select(models.Article)
@@ -72,51 +104,267 @@ async def get_article(db: AsyncSession, article_id: int):
     )
     return result.scalar_one_or_none()
 
+async def update_article_category(db: AsyncSession, article, category, user_id: int):
+    correction = models.CategoryCorrection(
+        article_id=article.id,
+        user_id=user_id,
+        old_category=article.category,
+        category=category
+    )
+    article.category = category
+    db.add(correction)
+    await db.commit()
+    return article
+
+async def get_labeled_articles_chunk(db: AsyncSession, after_id: int = 0, limit: int = 5000):
+    corrected = select(models.CategoryCorrection.article_id).where(
+        models.CategoryCorrection.article_id == models.Article.id
+    ).exists()
+    result = await db.execute(
+        select(
+            models.Article.id,
+            models.Article.title,
+            models.Article.summary,
+            models.Article.category,
+            corrected.label("corrected")
+        )
+        .where(models.Article.id > after_id)
+        .order_by(models.Article.id)
+        .limit(limit)
+    )
+    return result.all()
+
+async def get_corrections_after(db: AsyncSession, after_id: int = 0, limit: int = 5000):
+    result = await db.execute(
+        select(
+            models.CategoryCorrection.id,
+            models.Article.title,
+            models.Article.summary,
+            models.CategoryCorrection.category
+        )
+        .join(models.Article, models.Article.id == models.CategoryCorrection.article_id)
+        .where(models.CategoryCorrection.id > after_id)
+        .order_by(models.CategoryCorrection.id)
+        .limit(limit)
+    )
+    return result.all()
+
+async def get_last_correction_id(db: AsyncSession) -> int:
+    result = await db.execute(select(func.max(models.CategoryCorrection.id)))
+    return result.scalar() or 0
+
+async def get_recent_articles_for_dedup(db: AsyncSession, since):
+    result = await db.execute(
+        select(
+            models.Article.id,
+            models.Article.source_id,
+            models.Article.title,
+            models.Article.summary,
+            models.Article.duplicate_of,
+            models.Article.created_at
+        )
+        .where(models.Article.created_at >= since)
+        .order_by(models.Article.id)
+    )
+    return result.all()
+
+async def bulk_update_article_categories(db: AsyncSession, changes):
+    try:
+        await db.execute(
+            update(models.Article),
+            [{"id": article_id, "category": category} for article_id, category in changes]
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+async def get_article_ids_by_url_hash(db: AsyncSession, keys) -> dict:
+    result = await db.execute(
+        select(models.Article.url_hash, models.Article.id).where(models.Article.url_hash.in_(list(keys)))
+    )
+    return {row.url_hash: row.id for row in result}
+
+async def get_articles_without_url_hash(db: AsyncSession, after_id: int = 0, limit: int = 5000):
+    result = await db.execute(
+        select(models.Article.id, models.Article.source_url, models.Article.duplicate_of)
+        .where(models.Article.id > after_id, models.Article.url_hash.is_(None))
+        .order_by(models.Article.id)
+        .limit(limit)
+    )
+    return result.all()
+
+async def bulk_update_article_url_hashes(db: AsyncSession, changes, duplicates=()):
+    try:
+        if changes:
+            await db.execute(
+                update(models.Article),
+                [{"id": article_id, "url_hash": key} for article_id, key in changes]
+            )
+        if duplicates:
+            await db.execute(
+                update(models.Article),
+                [{"id": article_id, "duplicate_of": owner_id} for article_id, owner_id in duplicates]
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+async def get_content_samples(db: AsyncSession, limit: int = 2000) -> List[str]:
+    result = await db.execute(
+        select(models.Article.content)
+        .where(models.Article.content.isnot(None), models.Article.content != '')
+        .order_by(models.Article.id.desc())
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+async def get_content_chunk(db: AsyncSession, after_id: int = 0, limit: int = 500, compressed: bool = False):
+    if compressed:
+        query = select(models.Article.id, models.Article.content_compressed).where(
+            models.Article.content_compressed.isnot(None)
+        )
+    else:
+        query = select(models.Article.id, models.Article.content).where(
+            models.Article.content.isnot(None), models.Article.content != ''
+        )
+    result = await db.execute(
+        query.where(models.Article.id > after_id).order_by(models.Article.id).limit(limit)
+    )
+    return result.all()
+
+async def bulk_update_article_content(db: AsyncSession, changes: List[dict]):
+    try:
+        await db.execute(update(models.Article), changes)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+async def _mark_read(db: AsyncSession, user_id: Optional[int], items: List[dict]):
+    read_article_ids = set()
+    if user_id and items:
+        history_result = await db.execute(
+            select(models.ReadHistory.article_id)
+            .where(
+                models.ReadHistory.user_id == user_id,
+                models.ReadHistory.article_id.in_([item["id"] for item in items])
+            )
+        )
+        read_article_ids = {row[0] for row in history_result}
+    for item in items:
+        item["is_read"] = item["id"] in read_article_ids
+
+def _article_rows(rows) -> List[dict]:
+    return [dict(row._mapping) for row in rows]
+
+def _select_article_fields(fields):
+    columns = {"id"} | {field for field in fields if field != "is_read"}
+    return select(*[getattr(models.Article, column) for column in ARTICLE_LIST_FIELDS if column in columns])
+
+def _project(items: List[dict], fields) -> List[dict]:
+    if "id" in fields:
+        return items
+    for item in items:
+        del item["id"]
+    return items
+
 async def get_articles(
         db: AsyncSession,
         filter_params,
-        user_id: Optional[int] = None
+        user_id: Optional[int] = None,
+        fields=ARTICLE_LIST_FIELDS
 ):
-    query = select(models.Article).options(selectinload(models.Article.source))
+    query = _select_article_fields(fields)
 
     if filter_params.category:
         query = query.where(models.Article.category == filter_params.category)
     if filter_params.source_id:
         query = query.where(models.Article.source_id == filter_params.source_id)
+    else:
+        query = query.where(models.Article.duplicate_of.is_(None))
     if filter_params.search:
+        from app import content_store
         search_term = f"%{filter_params.search}%"
-        query = query.where(
-            or_(
-                models.Article.title.ilike(search_term),
-                models.Article.summary.ilike(search_term),
-                models.Article.content.ilike(search_term)
-            )
-        )
+        searched = [models.Article.title, models.Article.summary]
+        # compressed rows have no plain content, so with compression on every row is searched the same way
+        if not content_store.CONTENT_COMPRESSION:
+            searched.append(models.Article.content)
+        query = query.where(or_(*(column.ilike(search_term) for column in searched)))
 
     query = query.order_by(models.Article.published_at.desc())
     query = query.offset(filter_params.offset).limit(filter_params.limit)
 
     result = await db.execute(query)
-    articles = result.scalars().all()
+    articles = _article_rows(result)
+    if "is_read" in fields:
+        await _mark_read(db, user_id, articles)
+    return _project(articles, fields)
 
-    if user_id and articles:
-        article_ids = [article.id for article in articles]
-        history_result = await db.execute(
-            select(models.ReadHistory.article_id)
-            .where(
-                models.ReadHistory.user_id == user_id,
-                models.ReadHistory.article_id.in_(article_ids)
-            )
+def _older_than(cutoff):
+    return or_(
+        models.Article.published_at < cutoff,
+        and_(models.Article.published_at.is_(None), models.Article.created_at < cutoff)
+    )
+
+def _all_of(*clauses):
+    return and_(*[clause for clause in clauses if clause is not None])
+
+async def get_expired_articles(db: AsyncSession, source_cutoffs: dict, category_cutoffs: dict,
+                               default_cutoff=None, limit: int = 200):
+    """Cutoffs of None keep the scope forever; source rules override category rules, which override the default."""
+    outside_sources = or_(
+        models.Article.source_id.is_(None), models.Article.source_id.notin_(list(source_cutoffs))
+    ) if source_cutoffs else None
+    clauses = []
+    for source_id, cutoff in source_cutoffs.items():
+        if cutoff is not None:
+            clauses.append(and_(models.Article.source_id == source_id, _older_than(cutoff)))
+    for category, cutoff in category_cutoffs.items():
+        if cutoff is not None:
+            clauses.append(_all_of(outside_sources, models.Article.category == category, _older_than(cutoff)))
+    if default_cutoff is not None:
+        outside_categories = or_(
+            models.Article.category.is_(None), models.Article.category.notin_(list(category_cutoffs))
+        ) if category_cutoffs else None
+        clauses.append(_all_of(outside_sources, outside_categories, _older_than(default_cutoff)))
+    if not clauses:
+        return []
+
+    corrected = select(models.CategoryCorrection.article_id).where(
+        models.CategoryCorrection.article_id == models.Article.id
+    ).exists()
+    result = await db.execute(
+        select(models.Article)
+        .where(or_(*clauses), ~corrected)
+        .order_by(models.Article.id)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+async def delete_archived_articles(db: AsyncSession, partitions: dict):
+    article_ids = list(partitions)
+    try:
+        await db.execute(
+            insert(models.ArchivedArticle),
+            [{"id": article_id, "partition": partition} for article_id, partition in partitions.items()]
         )
-        read_article_ids = {row[0] for row in history_result}
-        
-        for article in articles:
-            article.is_read = article.id in read_article_ids
-    else:
-        for article in articles:
-            article.is_read = False
+        await db.execute(
+            update(models.Article).where(models.Article.duplicate_of.in_(article_ids)).values(duplicate_of=None)
+        )
+        await db.execute(delete(models.ReadHistory).where(models.ReadHistory.article_id.in_(article_ids)))
+        await db.execute(delete(models.Article).where(models.Article.id.in_(article_ids)))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
 
-    return articles
+async def get_archived_partition(db: AsyncSession, article_id: int) -> Optional[str]:
+    result = await db.execute(
+        select(models.ArchivedArticle.partition).where(models.ArchivedArticle.id == article_id)
+    )
+    return result.scalar_one_or_none()
 
 async def get_news_sources(db: AsyncSession, skip: int = 0, limit: int = 100):
     result = await db.execute(
@@ -127,6 +375,45 @@ async def get_news_sources(db: AsyncSession, skip: int = 0, limit: int = 100):
     )
     return result.scalars().all()
 
+async def get_news_source(db: AsyncSession, source_id: int):
+    result = await db.execute(
+        select(models.NewsSource).where(models.NewsSource.id == source_id)
+    )
+    return result.scalar_one_or_none()
+
+async def get_active_news_sources(db: AsyncSession):
+    result = await db.execute(
+        select(models.NewsSource)
+        .where(models.NewsSource.is_active == True)
+        .order_by(models.NewsSource.id)
+    )
+    return result.scalars().all()
+
+async def update_news_source(db: AsyncSession, source_id: int, **values):
+    await db.execute(
+        update(models.NewsSource)
+        .where(models.NewsSource.id == source_id)
+        .values(**values)
+    )
+    await db.commit()
+
+async def create_fetch_logs(db: AsyncSession, records: List[dict]):
+    if not records:
+        return
+    try:
+        await db.execute(insert(models.FetchLog), records)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+async def get_recent_fetch_logs(db: AsyncSession, limit: int = 1000, source_id: Optional[int] = None):
+    query = select(models.FetchLog.__table__)
+    if source_id is not None:
+        query = query.where(models.FetchLog.source_id == source_id)
+    result = await db.execute(query.order_by(desc(models.FetchLog.id)).limit(limit))
+    return [dict(row) for row in result.mappings()]
+
 async def create_read_history(db: AsyncSession, user_id: int, history):
     result = await db.execute(
         select(models.ReadHistory).where(
@@ -179,7 +466,7 @@ async def get_user_read_history(db: AsyncSession, user_id: int):
         })
     return history_items
 
-async def get_personalized_feed(db: AsyncSession, user_id: int, limit: int = 20):
+async def get_personalized_feed(db: AsyncSession, user_id: int, limit: int = 20, fields=ARTICLE_LIST_FIELDS):
     preferences_query = select(models.UserPreference.category).where(
         models.UserPreference.user_id == user_id,
         models.UserPreference.weight > 0.3
@@ -193,7 +480,7 @@ async def get_personalized_feed(db: AsyncSession, user_id: int, limit: int = 20)
     history_result = await db.execute(history_query)
     read_article_ids = [row[0] for row in history_result]
 
-    query = select(models.Article).options(joinedload(models.Article.source))
+    query = _select_article_fields(fields).where(models.Article.duplicate_of.is_(None))
 
     if read_article_ids:
         query = query.where(~models.Article.id.in_(read_article_ids))
@@ -204,5 +491,8 @@ async def get_personalized_feed(db: AsyncSession, user_id: int, limit: int = 20)
     query = query.order_by(desc(models.Article.published_at)).limit(limit)
 
     result = await db.execute(query)
-    articles = result.unique().scalars().all()
-    return articles
+    articles = _article_rows(result)
+    if "is_read" in fields:
+        for article in articles:
+            article["is_read"] = False
+    return _project(articles, fields)
@@ -0,0 +1,119 @@
+import os
+import random
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import feedparser
+
+from app.feed_stream import StreamingFeedParser, _parse_date, sanitize_entry
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+
+PARSER_REPROBE_EVERY = int(os.getenv("PARSER_REPROBE_EVERY", "20"))
+FALLBACK_PARSER = "feedparser"
+
+def parse_with_feedparser(content: bytes) -> List[Dict]:
+    feed = feedparser.parse(content)
+    entries = []
+    for entry in feed.entries:
+        published = None
+        if hasattr(entry, 'published_parsed') and entry.published_parsed:
+            published = datetime(*entry.published_parsed[:6])
+
+        entry_data = {
+            'entry_id': entry.get('id') or entry.get('link'),
+            'title': entry.title if hasattr(entry, 'title') else '',
+            'summary': entry.summary if hasattr(entry, 'summary') else '',
+            'content': entry.description if hasattr(entry, 'description') else '',
+            'source_url': entry.link if hasattr(entry, 'link') else '',
+            'image_url': None,
+            'published_at': published
+        }
+
+        if hasattr(entry, 'media_content'):
+            for media in entry.media_content:
+                if media.get('type', '').startswith('image'):
+                    entry_data['image_url'] = media.get('url')
+                    break
+
+        entries.append(entry_data)
+    return entries
+
+def parse_xml_stream(content: bytes) -> List[Dict]:
+    parser = StreamingFeedParser()
+    return parser.feed(content) + parser.close()
+
+def parse_json_feed(content: bytes) -> List[Dict]:
+    feed = json_loads(content)
+    if not str(feed.get('version', '')).startswith("https://jsonfeed.org/version/"):
+        raise ValueError("Not a JSON Feed document")
+    entries = []
+    for item in feed['items']:
+        summary = item.get('summary') or item.get('content_text') or ''
+        entries.append(sanitize_entry({
+            'entry_id': str(item['id']),
+            'title': item.get('title') or '',
+            'summary': summary,
+            'content': item.get('content_html') or item.get('content_text') or summary,
+            'source_url': item.get('url') or item.get('external_url') or '',
+            'image_url': item.get('image') or item.get('banner_image'),
+            'published_at': _parse_date(item.get('date_published') or item.get('date_modified'))
+        }))
+    return entries
+
+PARSERS: Dict[str, Callable[[bytes], List[Dict]]] = {
+    'jsonfeed': parse_json_feed,
+    'stream': parse_xml_stream,
+    FALLBACK_PARSER: parse_with_feedparser
+}
+
+def detect_parser(content: bytes) -> str:
+    start = content[:64].lstrip(b"\xef\xbb\xbf \t\r\n")
+    if start.startswith(b"{"):
+        return 'jsonfeed'
+    if start.startswith(b"<"):
+        return 'stream'
+    return FALLBACK_PARSER
+
+def parse(content: bytes, preferred: Optional[str] = None) -> Tuple[List[Dict], str]:
+    name = preferred if preferred in PARSERS else detect_parser(content)
+    if name == FALLBACK_PARSER and preferred == FALLBACK_PARSER and random.randrange(PARSER_REPROBE_EVERY) == 0:
+        name = detect_parser(content)
+    if name != FALLBACK_PARSER:
+        try:
+            return PARSERS[name](content), name
+        except Exception:
+            pass
+    return parse_with_feedparser(content), FALLBACK_PARSER
+
+def is_oldest_first(entries: List[Dict]) -> bool:
+    dated = [entry['published_at'] for entry in entries if entry['published_at']]
+    ascending = sum(earlier < later for earlier, later in zip(dated, dated[1:]))
+    descending = sum(earlier > later for earlier, later in zip(dated, dated[1:]))
+    return ascending > descending
+
+def newest_entry(entries: List[Dict]) -> Dict:
+    """High-water mark: the newest dated entry, or the first one when the feed has no dates."""
+    dated = [entry for entry in entries if entry['published_at']]
+    return max(dated, key=lambda entry: entry['published_at']) if dated else entries[0]
+
+def select_new_entries(entries: List[Dict], last_entry_id: Optional[str] = None,
+                       last_published_at: Optional[datetime] = None) -> List[Dict]:
+    """Returns new entries newest first; feeds listed oldest first are walked from the end."""
+    if is_oldest_first(entries):
+        entries = entries[::-1]
+    if last_entry_id and any(entry['entry_id'] == last_entry_id for entry in entries):
+        last_published_at = None
+    selected = []
+    for entry in entries:
+        if last_entry_id and entry['entry_id'] == last_entry_id:
+            break
+        if last_published_at and entry['published_at'] and entry['published_at'] < last_published_at:
+            continue
+        selected.append(entry)
+    return selected
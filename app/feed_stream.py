@@ -0,0 +1,115 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional
+
+from feedparser.sanitizer import _sanitize_html
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+MEDIA_NS = "{http://search.yahoo.com/mrss/}"
+
+HTML_FIELDS = ('title', 'summary', 'content')
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def sanitize_html(value: str) -> str:
+    """Same whitelist feedparser applies, so fast-path entries never carry scripts or handlers."""
+    return _sanitize_html(value, "utf-8", "text/html") if "<" in value else value
+
+def sanitize_entry(entry: Dict) -> Dict:
+    for field in HTML_FIELDS:
+        if entry[field]:
+            entry[field] = sanitize_html(entry[field])
+    return entry
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _text(element, *names: str) -> str:
+    for name in names:
+        child = element.find(name)
+        if child is not None and (child.text or len(child)):
+            return "".join(child.itertext()).strip()
+    return ""
+
+def _rss_item(item) -> Dict:
+    link = _text(item, "link")
+    image_url = None
+    for media in item.iter(f"{MEDIA_NS}content"):
+        if media.get("type", "").startswith("image"):
+            image_url = media.get("url")
+            break
+    if image_url is None:
+        enclosure = item.find("enclosure")
+        if enclosure is not None and enclosure.get("type", "").startswith("image"):
+            image_url = enclosure.get("url")
+    description = _text(item, "description")
+    return sanitize_entry({
+        'entry_id': _text(item, "guid") or link,
+        'title': _text(item, "title"),
+        'summary': description,
+        'content': description,
+        'source_url': link,
+        'image_url': image_url,
+        'published_at': _parse_date(_text(item, "pubDate", "{http://purl.org/dc/elements/1.1/}date"))
+    })
+
+def _atom_entry(entry) -> Dict:
+    link = ""
+    for link_element in entry.findall(f"{ATOM_NS}link"):
+        if link_element.get("rel", "alternate") == "alternate":
+            link = link_element.get("href", "")
+            break
+    summary = _text(entry, f"{ATOM_NS}summary", f"{ATOM_NS}content")
+    return sanitize_entry({
+        'entry_id': _text(entry, f"{ATOM_NS}id") or link,
+        'title': _text(entry, f"{ATOM_NS}title"),
+        'summary': summary,
+        'content': _text(entry, f"{ATOM_NS}content") or summary,
+        'source_url': link,
+        'image_url': None,
+        'published_at': _parse_date(_text(entry, f"{ATOM_NS}published", f"{ATOM_NS}updated"))
+    })
+
+class StreamingFeedParser:
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self.root = None
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        self._parser.feed(chunk)
+        return self._read_entries()
+
+    def close(self) -> List[Dict]:
+        self._parser.close()
+        return self._read_entries()
+
+    def _read_entries(self) -> List[Dict]:
+        entries = []
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if self.root is None:
+                    self.root = element.tag
+                    if self.root not in ("rss", f"{ATOM_NS}feed"):
+                        raise ValueError(f"Unsupported feed format: {_local_name(self.root)}")
+                continue
+            if element.tag == "item":
+                entries.append(_rss_item(element))
+                element.clear()
+            elif element.tag == f"{ATOM_NS}entry":
+                entries.append(_atom_entry(element))
+                element.clear()
+        return entries
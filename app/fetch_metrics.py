@@ -0,0 +1,83 @@
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from app import crud
+from app.database import AsyncSessionLocal
+
+FETCH_METRICS_WINDOW = int(os.getenv("FETCH_METRICS_WINDOW", "1000"))
+TIMING_FIELDS = ('total_ms', 'connect_ms', 'download_ms', 'parse_ms', 'categorize_ms', 'db_ms')
+COUNT_FIELDS = ('bytes_received', 'entries', 'new_items', 'duplicates')
+
+window = deque(maxlen=FETCH_METRICS_WINDOW)
+_pending = deque(maxlen=FETCH_METRICS_WINDOW)
+
+def new_record(source_id: int) -> Dict:
+    return {
+        'source_id': source_id,
+        'started_at': datetime.now(timezone.utc),
+        'status': None,
+        **{field: 0.0 for field in TIMING_FIELDS},
+        **{field: 0 for field in COUNT_FIELDS},
+        'error': None
+    }
+
+def record(metrics: Dict):
+    window.append(metrics)
+    _pending.append(metrics)
+
+async def flush() -> int:
+    records = list(_pending)
+    _pending.clear()
+    if not records:
+        return 0
+    try:
+        async with AsyncSessionLocal() as db:
+            await crud.create_fetch_logs(db, records)
+    except Exception as e:
+        print(f"Error saving fetch log: {e}")
+        return 0
+    return len(records)
+
+def _summarize(records: List[Dict]) -> Dict:
+    count = len(records)
+    summary = {
+        'fetches': count,
+        'errors': sum(1 for r in records if r['error']),
+        'not_modified': sum(1 for r in records if r['status'] == 304)
+    }
+    for field in TIMING_FIELDS:
+        values = sorted(r[field] or 0.0 for r in records)
+        total = sum(values)
+        summary[field] = {
+            'avg': round(total / count, 1),
+            'p95': round(values[min(count - 1, int(count * 0.95))], 1),
+            'sum': round(total, 1)
+        }
+    for field in COUNT_FIELDS:
+        summary[field] = sum(r[field] or 0 for r in records)
+    return summary
+
+def aggregate(records: Iterable[Dict], source_id: Optional[int] = None) -> Dict:
+    by_source = {}
+    for r in records:
+        if source_id is None or r['source_id'] == source_id:
+            by_source.setdefault(r['source_id'], []).append(r)
+    all_records = [r for source_records in by_source.values() for r in source_records]
+    if not all_records:
+        return {'fetches': 0, 'totals': None, 'sources': []}
+
+    return {
+        'fetches': len(all_records),
+        'since': min(r['started_at'] for r in all_records),
+        'totals': _summarize(all_records),
+        'sources': [
+            {
+                'source_id': key,
+                **_summarize(source_records),
+                'last_error': next((r['error'] for r in reversed(source_records) if r['error']), None)
+            }
+            for key, source_records in sorted(by_source.items())
+        ]
+    }
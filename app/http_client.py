@@ -0,0 +1,111 @@
+import aiohttp
+import os
+import time
+
+try:
+    import brotli  # noqa: F401
+    HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        HAS_BROTLI = True
+    except ImportError:
+        HAS_BROTLI = False
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "4"))
+HTTP_DNS_TTL_SECONDS = int(os.getenv("HTTP_DNS_TTL_SECONDS", "600"))
+# poll intervals are far longer than any server keeps an idle connection, so reuse happens within a round
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "120"))
+HTTP_MAX_RESPONSE_BYTES = int(os.getenv("HTTP_MAX_RESPONSE_BYTES", str(10 * 1024 * 1024)))
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "NewsHub/1.0")
+ACCEPT_ENCODING = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+
+class ResponseTooLarge(Exception):
+    pass
+
+class HTTPClient:
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 dns_ttl: int = HTTP_DNS_TTL_SECONDS, keepalive_timeout: float = HTTP_KEEPALIVE_SECONDS,
+                 max_response_bytes: int = HTTP_MAX_RESPONSE_BYTES):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.max_response_bytes = max_response_bytes
+        self.session = None
+        self.stats = {
+            'requests': 0,
+            'connections_opened': 0,
+            'connections_reused': 0,
+            'dns_cache_hits': 0,
+            'dns_cache_misses': 0,
+            'bytes_received': 0
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def count(name):
+            async def handler(session, context, params):
+                self.stats[name] += 1
+            return handler
+
+        def mark(name):
+            async def handler(session, context, params):
+                if isinstance(context.trace_request_ctx, dict):
+                    context.trace_request_ctx[name] = time.perf_counter()
+            return handler
+
+        trace_config.on_request_start.append(count('requests'))
+        trace_config.on_connection_create_start.append(mark('connect_started'))
+        trace_config.on_connection_create_end.append(mark('connect_finished'))
+        trace_config.on_connection_create_end.append(count('connections_opened'))
+        trace_config.on_connection_reuseconn.append(count('connections_reused'))
+        trace_config.on_dns_cache_hit.append(count('dns_cache_hits'))
+        trace_config.on_dns_cache_miss.append(count('dns_cache_misses'))
+        return trace_config
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                headers={'Accept-Encoding': ACCEPT_ENCODING, 'User-Agent': HTTP_USER_AGENT},
+                trace_configs=[self._trace_config()]
+            )
+        return self.session
+
+    @staticmethod
+    def connect_seconds(timings: dict) -> float:
+        if 'connect_finished' not in timings:
+            return 0.0
+        return timings['connect_finished'] - timings['connect_started']
+
+    def check_size(self, response: aiohttp.ClientResponse, received: int = 0):
+        if response.content_length is not None and response.content_length > self.max_response_bytes:
+            raise ResponseTooLarge(f"{response.url} declares {response.content_length} bytes")
+        if received > self.max_response_bytes:
+            raise ResponseTooLarge(f"{response.url} exceeded {self.max_response_bytes} bytes")
+
+    async def iter_body(self, response: aiohttp.ClientResponse, chunk_size: int = 65536):
+        self.check_size(response)
+        received = 0
+        async for chunk in response.content.iter_chunked(chunk_size):
+            received += len(chunk)
+            self.stats['bytes_received'] += len(chunk)
+            self.check_size(response, received)
+            yield chunk
+
+    async def read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_body(response)])
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
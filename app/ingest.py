@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import heapq
+import os
+import random
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from app.database import AsyncSessionLocal, init_models
+from app import backfill, crud, circuit_breaker, fetch_metrics, naive_bayes, near_duplicates, retention, rss_parser, websub
+
+FETCH_INTERVAL_SECONDS = int(os.getenv("FETCH_INTERVAL_SECONDS", "1800"))
+POLL_MIN_SECONDS = int(os.getenv("POLL_MIN_SECONDS", "120"))
+POLL_MAX_SECONDS = int(os.getenv("POLL_MAX_SECONDS", "14400"))
+POLL_JITTER = float(os.getenv("POLL_JITTER", "0.1"))
+POLL_TARGET_NEW_ITEMS = float(os.getenv("POLL_TARGET_NEW_ITEMS", "5"))
+POLL_BACKOFF_FACTOR = float(os.getenv("POLL_BACKOFF_FACTOR", "1.5"))
+SOURCE_REFRESH_SECONDS = int(os.getenv("SOURCE_REFRESH_SECONDS", "300"))
+HOST_GROUP_WINDOW_SECONDS = int(os.getenv("HOST_GROUP_WINDOW_SECONDS", "300"))
+
+def next_poll_interval(interval: float, new_items: int) -> float:
+    if new_items > 0:
+        target = POLL_TARGET_NEW_ITEMS * interval / new_items
+    else:
+        target = interval * POLL_BACKOFF_FACTOR
+    interval = (interval + target) / 2
+    return min(max(interval, POLL_MIN_SECONDS), POLL_MAX_SECONDS)
+
+async def fetch_source(parser: rss_parser.RSSParser, source) -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            saved = await parser.parse_and_save_articles(db, source)
+            if saved > 0:
+                print(f"Saved {saved} articles from {source.name}")
+            return saved
+    except Exception as e:
+        print(f"Error fetching from {source.name}: {e}")
+        return 0
+
+def _log_cycle(parser: rss_parser.RSSParser, started: float, saved: int, sources_count: int):
+    elapsed = time.perf_counter() - started
+    stats = parser.http.stats
+    print(
+        f"Fetch cycle finished in {elapsed:.1f}s: {saved} new articles from {sources_count} sources "
+        f"(connections opened {stats['connections_opened']}, reused {stats['connections_reused']})"
+    )
+
+async def run_fetch_cycle(parser: rss_parser.RSSParser) -> int:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        sources = await crud.get_active_news_sources(db)
+    sources = [source for source in sources if not circuit_breaker.is_open(source)]
+
+    results = await asyncio.gather(*(fetch_source(parser, source) for source in sources))
+    saved = sum(results)
+    _log_cycle(parser, started, saved, len(sources))
+    await fetch_metrics.flush()
+    return saved
+
+class FeedScheduler:
+    def __init__(self, parser: rss_parser.RSSParser):
+        self.parser = parser
+        self.queue = []
+        self.due = {}
+        self.sources = {}
+        self.tasks = set()
+        self.sources_loaded_at = None
+        self.wakeup = asyncio.Event()
+
+    def _schedule(self, source_id: int, due: float):
+        self.due[source_id] = due
+        heapq.heappush(self.queue, (due, source_id))
+        self.wakeup.set()
+
+    async def load_sources(self):
+        async with AsyncSessionLocal() as db:
+            sources = await crud.get_active_news_sources(db)
+        self.sources = {source.id: source for source in sources}
+        self.sources_loaded_at = time.monotonic()
+
+        now = time.time()
+        for source in sources:
+            if source.id not in self.due:
+                self._schedule(source.id, circuit_breaker.as_utc(source.next_fetch_at).timestamp() if source.next_fetch_at else now)
+        for source_id in list(self.due):
+            if source_id not in self.sources:
+                del self.due[source_id]
+
+    def _pop_due(self, now: float):
+        sources = []
+        while self.queue and self.queue[0][0] <= now:
+            due, source_id = heapq.heappop(self.queue)
+            if self.due.get(source_id) != due:
+                continue
+            source = self.sources[source_id]
+            if circuit_breaker.is_open(source):
+                self._schedule(source_id, circuit_breaker.as_utc(source.retry_at).timestamp())
+                continue
+            self.due[source_id] = None
+            sources.append(source)
+        return sources + self._pull_same_host(sources, now)
+
+    def _pull_same_host(self, sources, now: float):
+        """Polls due soon on a host that is fetched now join this round and reuse its keep-alive connections."""
+        hosts = {urlparse(source.url).hostname for source in sources}
+        if not hosts or HOST_GROUP_WINDOW_SECONDS <= 0:
+            return []
+        pulled = []
+        for due, source_id in self.queue:
+            if due > now + HOST_GROUP_WINDOW_SECONDS or self.due.get(source_id) != due:
+                continue
+            source = self.sources[source_id]
+            if urlparse(source.url).hostname in hosts and not circuit_breaker.is_open(source):
+                self.due[source_id] = None
+                pulled.append(source)
+        return pulled
+
+    async def _poll(self, source) -> int:
+        saved = await fetch_source(self.parser, source)
+
+        interval = next_poll_interval(source.poll_interval or FETCH_INTERVAL_SECONDS, saved)
+        delay = max(interval, websub.WEBSUB_FALLBACK_POLL_SECONDS) if websub.is_subscribed(source) else interval
+        due = time.time() + delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        if source.retry_at:
+            due = max(due, circuit_breaker.as_utc(source.retry_at).timestamp())
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud.update_news_source(
+                    db, source.id,
+                    poll_interval=int(interval),
+                    next_fetch_at=datetime.fromtimestamp(due, timezone.utc)
+                )
+        except Exception as e:
+            print(f"Error scheduling {source.name}: {e}")
+        source.poll_interval = int(interval)
+
+        if not source.is_active:
+            self.due.pop(source.id, None)
+        elif source.id in self.due:
+            self._schedule(source.id, due)
+        return saved
+
+    async def _run_round(self, sources):
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._poll(source) for source in sources))
+        _log_cycle(self.parser, started, sum(results), len(sources))
+        await fetch_metrics.flush()
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    if self.sources_loaded_at is None or time.monotonic() - self.sources_loaded_at > SOURCE_REFRESH_SECONDS:
+                        await self.load_sources()
+                except Exception as e:
+                    print(f"Error loading news sources: {e}")
+
+                sources = self._pop_due(time.time())
+                if sources:
+                    task = asyncio.create_task(self._run_round(sources))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+
+                self.wakeup.clear()
+                delay = self.queue[0][0] - time.time() if self.queue else SOURCE_REFRESH_SECONDS
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=min(max(delay, 1), SOURCE_REFRESH_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in self.tasks:
+                task.cancel()
+
+async def fetch_news_feeds():
+    try:
+        await backfill.backfill_url_hashes(pause_seconds=0)
+    except Exception as e:
+        print(f"Error hashing legacy article URLs: {e}")
+    if near_duplicates.NEAR_DUP_ENABLED:
+        try:
+            await near_duplicates.get_index()
+        except Exception as e:
+            print(f"Error building near-duplicate index: {e}")
+    parser = rss_parser.RSSParser()
+    subscriptions = asyncio.create_task(websub.WebSubManager(parser.http).run()) if websub.enabled() else None
+    archiving = asyncio.create_task(retention.run()) if retention.enabled(retention.load_policy()) else None
+    corrections = asyncio.create_task(naive_bayes.run())
+    try:
+        await FeedScheduler(parser).run()
+    finally:
+        for task in (subscriptions, archiving, corrections):
+            if task is not None:
+                task.cancel()
+        await parser.close()
+
+async def main(once: bool = False):
+    await init_models()
+    if not once:
+        await fetch_news_feeds()
+        return
+
+    parser = rss_parser.RSSParser()
+    try:
+        await run_fetch_cycle(parser)
+    finally:
+        await parser.close()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="NewsHub news ingestion worker")
+    arg_parser.add_argument("--once", action="store_true", help="fetch every active source once and exit")
+    args = arg_parser.parse_args()
+    try:
+        asyncio.run(main(once=args.once))
+    except KeyboardInterrupt:
+        pass
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Query, BackgroundTasks
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
@@ -6,18 +7,24 @@ from datetime import timedelta
 from typing import List, Optional
 from contextlib import asynccontextmanager
 import asyncio
+import os
 
-from app.database import engine, Base, get_db, AsyncSessionLocal
-from app import crud, auth, rss_parser
+from app.database import get_db, AsyncSessionLocal, init_models
+from app import crud, auth, categorizer, content_store, fetch_metrics, http_client, naive_bayes, retention, \
+    vector_categorizer, websub
+from app.ingest import fetch_news_feeds
 from app.models import NewsSource, ArticleCategory
-from app.schemas import UserCreate, UserLogin, ArticleFilter, ReadHistoryCreate
+from app.schemas import UserCreate, UserLogin, ArticleFilter, ReadHistoryCreate, CategoryCorrectionCreate, \
+    CategoryKeywordsUpdate
+
+INGEST_IN_API = os.getenv("INGEST_IN_API", "true").lower() == "true"
 
 def serialize_article(article) -> dict:
     return {
         "id": article.id,
         "title": article.title,
         "summary": article.summary,
-        "content": article.content,
+        "content": content_store.article_content(article),
         "source_url": article.source_url,
         "image_url": article.image_url,
         "category": article.category,
@@ -27,38 +34,42 @@ def serialize_article(article) -> dict:
         "is_read": getattr(article, 'is_read', False)
     }
 
-async def fetch_news_feeds():
-    parser = rss_parser.RSSParser()
-    try:
-        while True:
-            try:
-                async with AsyncSessionLocal() as db:
-                    sources = await crud.get_news_sources(db)
-                    
-                    for source in sources:
-                        if source.is_active:
-                            try:
-                                print(f"Fetching news from {source.name}...")
-                                saved = await parser.parse_and_save_articles(db, source.id, source.url)
-                                if saved > 0:
-                                    print(f"Saved {saved} articles from {source.name}")
-                            except Exception as e:
-                                print(f"Error fetching from {source.name}: {e}")
-                                continue
-            except Exception as e:
-                print(f"Error fetching news: {e}")
+def parse_article_fields(fields: Optional[str]):
+    if not fields:
+        return crud.ARTICLE_LIST_FIELDS
+    if fields == "card":
+        return crud.ARTICLE_CARD_FIELDS
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in crud.ARTICLE_LIST_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(crud.ARTICLE_LIST_FIELDS)} или card"
+        )
+    return tuple(dict.fromkeys(requested))
 
-            await asyncio.sleep(1800)
-    finally:
-        await parser.close()
+async def read_limited_body(request: Request, max_bytes: int) -> bytes:
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Слишком большое тело запроса"
+    )
+    content_length = request.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting NewsHub API...")
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        await init_models()
         print("Database tables created")
+        naive_bayes.get_model()
 
         async with AsyncSessionLocal() as session:
             try:
@@ -83,7 +94,11 @@ async def lifespan(app: FastAPI):
             except Exception as e:
                 print(f"Warning: {e}")
 
-        task = asyncio.create_task(fetch_news_feeds())
+        task = None
+        if INGEST_IN_API:
+            task = asyncio.create_task(fetch_news_feeds())
+        else:
+            print("In-process news fetching disabled, run `python -m app.ingest` separately")
 
     except Exception as e:
         print(f"Critical error: {e}")
@@ -93,11 +108,13 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await websub.close()
     print("Shutting down...")
 
 app = FastAPI(
@@ -191,6 +208,7 @@ async def read_articles(
         search: Optional[str] = None,
         limit: int = 20,
         offset: int = 0,
+        fields: Optional[str] = None,
         db: AsyncSession = Depends(get_db),
         current_user=Depends(auth.get_current_active_user)
 ):
@@ -203,8 +221,7 @@ async def read_articles(
         limit=limit,
         offset=offset
     )
-    articles = await crud.get_articles(db, filter_params, current_user.id)
-    return [serialize_article(a) for a in articles]
+    return await crud.get_articles(db, filter_params, current_user.id, parse_article_fields(fields))
 
 @app.get("/api/articles/{article_id}", response_model=dict)
 async def read_article(
@@ -214,7 +231,13 @@ async def read_article(
 ):
     article = await crud.get_article(db, article_id)
     if article is None:
-        raise HTTPException(status_code=404, detail="Статья не найдена")
+        archived = await retention.read_archived(db, article_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Статья не найдена")
+        source = await crud.get_news_source(db, archived["source_id"]) if archived["source_id"] else None
+        if source:
+            archived["source"] = {"id": source.id, "name": source.name}
+        return archived
 
     article_dict = serialize_article(article)
     if article.source:
@@ -222,6 +245,52 @@ async def read_article(
 
     return article_dict
 
+@app.put("/api/articles/{article_id}/category", response_model=dict)
+async def correct_article_category(
+        article_id: int,
+        correction: CategoryCorrectionCreate,
+        db: AsyncSession = Depends(get_db),
+        current_user=Depends(auth.get_current_admin_user)
+):
+    article = await crud.get_article(db, article_id)
+    if article is None:
+        raise HTTPException(status_code=404, detail="Статья не найдена")
+
+    article = await crud.update_article_category(db, article, correction.category, current_user.id)
+    return serialize_article(article)
+
+@app.get("/api/categories/keywords", response_model=dict)
+async def read_category_keywords(current_user=Depends(auth.get_current_admin_user)):
+    return {**categorizer.get_categorizer().to_dict(), 'categorizer': vector_categorizer.active_categorizer()}
+
+@app.put("/api/categories/keywords", response_model=dict)
+async def update_category_keywords(
+        keywords: CategoryKeywordsUpdate,
+        current_user=Depends(auth.get_current_admin_user)
+):
+    try:
+        updated = await asyncio.to_thread(categorizer.update_categorizer, keywords.categories, keywords.version)
+    except categorizer.KeywordsVersionConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Словарь уже изменён, текущая версия {e.current_version}"
+        )
+    return {**updated.to_dict(), 'categorizer': vector_categorizer.active_categorizer()}
+
+@app.get("/api/ingest/metrics", response_model=dict)
+async def read_ingest_metrics(
+        source_id: Optional[int] = None,
+        persisted: bool = False,
+        db: AsyncSession = Depends(get_db),
+        current_user=Depends(auth.get_current_admin_user)
+):
+    if INGEST_IN_API and not persisted:
+        records = list(fetch_metrics.window)
+    else:
+        records = await crud.get_recent_fetch_logs(db, fetch_metrics.FETCH_METRICS_WINDOW, source_id)
+        records.reverse()
+    return fetch_metrics.aggregate(records, source_id)
+
 @app.get("/api/sources/", response_model=List[dict])
 async def read_sources(
         skip: int = 0,
@@ -245,13 +314,45 @@ async def read_sources(
         for s in sources
     ]
 
+@app.get("/api/websub/{source_id}", response_class=PlainTextResponse)
+async def verify_websub_subscription(
+        source_id: int,
+        mode: str = Query(..., alias="hub.mode"),
+        topic: Optional[str] = Query(None, alias="hub.topic"),
+        challenge: Optional[str] = Query(None, alias="hub.challenge"),
+        lease_seconds: Optional[int] = Query(None, alias="hub.lease_seconds")
+):
+    if mode == "denied":
+        if not await websub.subscription_denied(source_id, topic):
+            raise HTTPException(status_code=404, detail="Подписка не найдена")
+        return ""
+    if challenge is None or not await websub.verify_intent(source_id, mode, topic, lease_seconds):
+        raise HTTPException(status_code=404, detail="Подписка не найдена")
+    return challenge
+
+@app.post("/api/websub/{source_id}", status_code=status.HTTP_202_ACCEPTED)
+async def receive_websub_content(
+        source_id: int,
+        request: Request,
+        background_tasks: BackgroundTasks,
+        db: AsyncSession = Depends(get_db)
+):
+    source = await crud.get_news_source(db, source_id)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Источник не найден")
+    body = await read_limited_body(request, http_client.HTTP_MAX_RESPONSE_BYTES)
+    if not websub.verify_signature(source.websub_secret, body, request.headers.get("X-Hub-Signature")):
+        raise HTTPException(status_code=403, detail="Неверная подпись")
+    background_tasks.add_task(websub.process_push, source_id, body)
+    return Response(status_code=status.HTTP_202_ACCEPTED)
+
 @app.get("/api/feed/personal", response_model=List[dict])
 async def get_personalized_feed(
+        fields: Optional[str] = None,
         db: AsyncSession = Depends(get_db),
         current_user=Depends(auth.get_current_active_user)
 ):
-    articles = await crud.get_personalized_feed(db, current_user.id)
-    return [serialize_article(a) for a in articles]
+    return await crud.get_personalized_feed(db, current_user.id, fields=parse_article_fields(fields))
 
 @app.post("/api/history/", response_model=dict)
 async def add_read_history(
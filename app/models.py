@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, Enum, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, Float, Enum, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -40,6 +40,23 @@ class NewsSource(Base):
     language = Column(String, default="ru")
     is_active = Column(Boolean, default=True)
     last_fetch = Column(DateTime(timezone=True))
+    etag = Column(String)
+    last_modified = Column(String)
+    last_entry_id = Column(String)
+    last_published_at = Column(DateTime(timezone=True))
+    poll_interval = Column(Integer)
+    next_fetch_at = Column(DateTime(timezone=True))
+    failure_count = Column(Integer, default=0)
+    retry_at = Column(DateTime(timezone=True))
+    last_error = Column(String)
+    content_hash = Column(String)
+    parser = Column(String)
+    websub_hub = Column(String)
+    websub_topic = Column(String)
+    websub_secret = Column(String)
+    websub_lease_expires_at = Column(DateTime(timezone=True))
+    websub_pending_mode = Column(String)
+    websub_pending_until = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Article(Base):
@@ -48,11 +65,14 @@ class Article(Base):
     title = Column(String, nullable=False, index=True)
     summary = Column(Text)
     content = Column(Text)
-    source_url = Column(String, nullable=False, unique=True)
+    content_compressed = Column(LargeBinary)
+    source_url = Column(String, nullable=False)
+    url_hash = Column(BigInteger)
     image_url = Column(String)
     category = Column(Enum(ArticleCategory), default=ArticleCategory.GENERAL, index=True)
     published_at = Column(DateTime(timezone=True), index=True)
     source_id = Column(Integer, ForeignKey("news_sources.id"), index=True)
+    duplicate_of = Column(Integer, ForeignKey("articles.id"), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     source = relationship("NewsSource")
     read_history = relationship("ReadHistory", back_populates="article", cascade="all, delete-orphan")
@@ -60,6 +80,7 @@ class Article(Base):
     __table_args__ = (
         Index('idx_article_category_published', 'category', 'published_at'),
         Index('idx_article_source_published', 'source_id', 'published_at'),
+        Index('ix_articles_url_hash', 'url_hash', unique=True),
     )
 
 class UserPreference(Base):
@@ -90,3 +111,40 @@ class ReadHistory(Base):
     __table_args__ = (
         Index('idx_read_history_user_article', 'user_id', 'article_id', unique=True),
     )
+
+class CategoryCorrection(Base):
+    __tablename__ = "category_corrections"
+    id = Column(Integer, primary_key=True, index=True)
+    article_id = Column(Integer, ForeignKey("articles.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    old_category = Column(Enum(ArticleCategory))
+    category = Column(Enum(ArticleCategory), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class FetchLog(Base):
+    __tablename__ = "fetch_log"
+    id = Column(Integer, primary_key=True, index=True)
+    source_id = Column(Integer, ForeignKey("news_sources.id"), index=True)
+    started_at = Column(DateTime(timezone=True), index=True)
+    status = Column(Integer)
+    total_ms = Column(Float)
+    connect_ms = Column(Float)
+    download_ms = Column(Float)
+    bytes_received = Column(Integer)
+    parse_ms = Column(Float)
+    categorize_ms = Column(Float)
+    db_ms = Column(Float)
+    entries = Column(Integer)
+    new_items = Column(Integer)
+    duplicates = Column(Integer)
+    error = Column(String)
+
+    __table_args__ = (
+        Index('idx_fetch_log_source_started', 'source_id', 'started_at'),
+    )
+
+class ArchivedArticle(Base):
+    __tablename__ = "archived_articles"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    partition = Column(String(10), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
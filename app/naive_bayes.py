@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app import crud
+from app.database import AsyncSessionLocal
+from app.models import ArticleCategory
+from app.vector_categorizer import CATEGORIES, HashedLinearModel, hashed_features
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CATEGORY_MODEL_PATH = os.getenv("CATEGORY_MODEL_PATH", "category_model.npz")
+NB_HASH_BITS = int(os.getenv("NB_HASH_BITS", "18"))
+NB_NGRAM = int(os.getenv("NB_NGRAM", "1"))
+NB_ALPHA = float(os.getenv("NB_ALPHA", "0.1"))
+NB_CORRECTION_WEIGHT = float(os.getenv("NB_CORRECTION_WEIGHT", "5"))
+NB_RELOAD_CHECK_SECONDS = float(os.getenv("NB_RELOAD_CHECK_SECONDS", "60"))
+NB_FOLD_INTERVAL_SECONDS = float(os.getenv("NB_FOLD_INTERVAL_SECONDS", "60"))
+TRAIN_CHUNK_SIZE = 5000
+
+def article_text(title: str, summary: Optional[str]) -> str:
+    return f"{title} {summary}" if summary else title
+
+class NaiveBayesModel:
+    def __init__(self, hash_bits: int = NB_HASH_BITS, ngram: int = NB_NGRAM, alpha: float = NB_ALPHA,
+                 feature_counts: Optional[np.ndarray] = None, class_counts: Optional[np.ndarray] = None,
+                 corrections_through: int = 0):
+        self.hash_bits = hash_bits
+        self.buckets = 1 << hash_bits
+        self.ngram = ngram
+        self.alpha = alpha
+        self.feature_counts = feature_counts if feature_counts is not None else np.zeros(
+            (self.buckets, len(CATEGORIES)), dtype=np.float32
+        )
+        self.class_counts = class_counts if class_counts is not None else np.zeros(len(CATEGORIES))
+        self.corrections_through = corrections_through
+        self._linear = None
+
+    def partial_fit(self, texts: Sequence[str], labels: Sequence[ArticleCategory],
+                    weights: Optional[Sequence[float]] = None):
+        if not texts:
+            return
+        label_indexes = np.array([CATEGORIES.index(ArticleCategory(label)) for label in labels])
+        doc_weights = np.ones(len(texts)) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        doc_ids, hashes = hashed_features(texts, self.ngram)
+        buckets = (hashes % self.buckets).astype(np.int64)
+        np.add.at(self.feature_counts, (buckets, label_indexes[doc_ids]), doc_weights[doc_ids])
+        np.add.at(self.class_counts, label_indexes, doc_weights)
+        self._linear = None
+
+    def linear_model(self) -> HashedLinearModel:
+        if self._linear is None:
+            totals = self.feature_counts.sum(axis=0, dtype=np.float64)
+            log_likelihood = np.log(self.feature_counts + np.float32(self.alpha))
+            log_likelihood -= np.log(totals + self.alpha * self.buckets).astype(np.float32)
+            prior = np.log(self.class_counts + 1) - np.log(self.class_counts.sum() + len(CATEGORIES))
+            self._linear = HashedLinearModel(
+                None, log_likelihood, bias=prior, ngram=self.ngram, buckets=self.buckets
+            )
+        return self._linear
+
+    def predict(self, texts: Sequence[str]) -> List[ArticleCategory]:
+        return self.linear_model().predict(list(texts))
+
+    def save(self, path: str = CATEGORY_MODEL_PATH):
+        temporary_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            temporary_path,
+            feature_counts=self.feature_counts,
+            class_counts=self.class_counts,
+            params=np.array([self.hash_bits, self.ngram, self.alpha]),
+            corrections_through=np.array(self.corrections_through)
+        )
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path: str = CATEGORY_MODEL_PATH) -> "NaiveBayesModel":
+        with np.load(path) as data:
+            hash_bits, ngram, alpha = data["params"]
+            corrections_through = int(data["corrections_through"]) if "corrections_through" in data else 0
+            return cls(int(hash_bits), int(ngram), float(alpha), data["feature_counts"], data["class_counts"],
+                       corrections_through)
+
+def saved_corrections_through(path: str = CATEGORY_MODEL_PATH) -> int:
+    with np.load(path) as data:
+        return int(data["corrections_through"]) if "corrections_through" in data else 0
+
+@contextmanager
+def model_lock(path: str = CATEGORY_MODEL_PATH):
+    with open(f"{path}.lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+_model = None
+_model_mtime = None
+_checked_at = None
+
+def get_model() -> Optional[NaiveBayesModel]:
+    global _model, _model_mtime, _checked_at
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < NB_RELOAD_CHECK_SECONDS:
+        return _model
+    _checked_at = now
+    try:
+        mtime = os.stat(CATEGORY_MODEL_PATH).st_mtime
+    except OSError:
+        return _model
+    if mtime != _model_mtime:
+        try:
+            _model = NaiveBayesModel.load(CATEGORY_MODEL_PATH)
+            _model_mtime = mtime
+            print(f"Loaded category model from {CATEGORY_MODEL_PATH}")
+        except Exception as e:
+            print(f"Error loading category model {CATEGORY_MODEL_PATH}: {e}")
+    return _model
+
+def set_model(model: Optional[NaiveBayesModel], path: str = CATEGORY_MODEL_PATH):
+    global _model, _model_mtime, _checked_at
+    _model = model
+    _checked_at = time.monotonic()
+    if path == CATEGORY_MODEL_PATH and os.path.exists(path):
+        _model_mtime = os.stat(path).st_mtime
+
+def _fold_into_file(rows, path: str) -> int:
+    """Reloads the saved model under the lock so a concurrent train or fold is never overwritten."""
+    with model_lock(path):
+        model = NaiveBayesModel.load(path)
+        rows = [row for row in rows if row.id > model.corrections_through]
+        if not rows:
+            return 0
+        model.partial_fit(
+            [article_text(row.title, row.summary) for row in rows],
+            [row.category for row in rows],
+            [NB_CORRECTION_WEIGHT] * len(rows)
+        )
+        model.corrections_through = rows[-1].id
+        model.save(path)
+        set_model(model, path)
+    return len(rows)
+
+async def fold_corrections(path: str = CATEGORY_MODEL_PATH) -> int:
+    """Folds admin corrections recorded since the last fold into the saved model.
+
+    The API only records corrections in category_corrections; this is the single
+    writer of the model file, and API workers pick the result up on reload.
+    """
+    if not os.path.exists(path):
+        return 0
+    corrections_through = await asyncio.to_thread(saved_corrections_through, path)
+    async with AsyncSessionLocal() as db:
+        rows = await crud.get_corrections_after(db, corrections_through, TRAIN_CHUNK_SIZE)
+    if not rows:
+        return 0
+    folded = await asyncio.to_thread(_fold_into_file, rows, path)
+    if folded:
+        print(f"Folded {folded} category corrections into {path}")
+    return len(rows)
+
+async def run():
+    while True:
+        try:
+            while await fold_corrections() >= TRAIN_CHUNK_SIZE:
+                pass
+        except Exception as e:
+            print(f"Error folding category corrections: {e}")
+        await asyncio.sleep(NB_FOLD_INTERVAL_SECONDS)
+
+async def iter_labeled_chunks(chunk_size: int = TRAIN_CHUNK_SIZE):
+    after_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = await crud.get_labeled_articles_chunk(db, after_id, chunk_size)
+        if not rows:
+            return
+        after_id = rows[-1].id
+        yield rows
+
+def _chunk_data(rows):
+    texts = [article_text(row.title, row.summary) for row in rows]
+    labels = [row.category for row in rows]
+    weights = [NB_CORRECTION_WEIGHT if row.corrected else 1.0 for row in rows]
+    return texts, labels, weights
+
+async def train(path: str = CATEGORY_MODEL_PATH) -> NaiveBayesModel:
+    model = NaiveBayesModel()
+    async with AsyncSessionLocal() as db:
+        # corrections made while training are folded in afterwards by the ingest process
+        model.corrections_through = await crud.get_last_correction_id(db)
+    trained = 0
+    async for rows in iter_labeled_chunks():
+        texts, labels, weights = _chunk_data(rows)
+        model.partial_fit(texts, labels, weights)
+        trained += len(rows)
+    with model_lock(path):
+        model.save(path)
+    set_model(model, path)
+    print(f"Trained category model on {trained} articles, saved to {path}")
+    return model
+
+async def report(holdout_every: int = 5):
+    model = NaiveBayesModel()
+    test_texts, test_labels = [], []
+    async for rows in iter_labeled_chunks():
+        train_rows = [row for row in rows if row.id % holdout_every]
+        test_rows = [row for row in rows if not row.id % holdout_every]
+        model.partial_fit(*_chunk_data(train_rows))
+        test_texts.extend(article_text(row.title, row.summary) for row in test_rows)
+        test_labels.extend(ArticleCategory(row.category) for row in test_rows)
+
+    if not test_texts:
+        print("No labeled articles to evaluate")
+        return
+
+    model.linear_model()
+    started = time.perf_counter()
+    predicted = model.predict(test_texts)
+    elapsed = time.perf_counter() - started
+
+    correct = sum(p == label for p, label in zip(predicted, test_labels))
+    print(f"Accuracy: {correct / len(test_labels):.3f} on {len(test_labels)} held-out articles")
+    print(f"Throughput: {len(test_texts) / elapsed:,.0f} articles/s ({elapsed / len(test_texts) * 1e6:.1f} us/article)")
+    for category in CATEGORIES:
+        support = sum(label == category for label in test_labels)
+        if support:
+            hits = sum(p == label == category for p, label in zip(predicted, test_labels))
+            print(f"  {category.value:<14} recall {hits / support:.3f}  support {support}")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="NewsHub category model")
+    arg_parser.add_argument("command", choices=["train", "report"])
+    arg_parser.add_argument("--path", default=CATEGORY_MODEL_PATH)
+    arg_parser.add_argument("--holdout-every", type=int, default=5, help="every N-th article id is held out")
+    args = arg_parser.parse_args()
+    if args.command == "train":
+        asyncio.run(train(args.path))
+    else:
+        asyncio.run(report(args.holdout_every))
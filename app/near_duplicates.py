@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import crud
+from app.categorizer import WORD_RE
+from app.database import AsyncSessionLocal
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "true").lower() == "true"
+NEAR_DUP_ACTION = os.getenv("NEAR_DUP_ACTION", "link")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.6"))
+NEAR_DUP_WINDOW_HOURS = float(os.getenv("NEAR_DUP_WINDOW_HOURS", "48"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_ROWS = int(os.getenv("NEAR_DUP_ROWS", "4"))
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+_permutation_rng = np.random.default_rng(20240101)
+PERMUTATION_A = _permutation_rng.integers(1, 2 ** 63, NEAR_DUP_BANDS * NEAR_DUP_ROWS, dtype=np.uint64) | np.uint64(1)
+PERMUTATION_B = _permutation_rng.integers(0, 2 ** 63, NEAR_DUP_BANDS * NEAR_DUP_ROWS, dtype=np.uint64)
+
+def token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+def minhashes(texts: Sequence[str]) -> np.ndarray:
+    doc_tokens = [WORD_RE.findall(text.lower()) for text in texts]
+    hashes = {token: token_hash(token) for tokens in doc_tokens for token in tokens}
+    shingles, lengths = [], []
+    for tokens in doc_tokens:
+        token_hashes = np.fromiter((hashes[token] for token in tokens), dtype=np.uint64, count=len(tokens))
+        if len(token_hashes) > 1:
+            token_hashes = token_hashes[:-1] * SHINGLE_MULTIPLIER + token_hashes[1:]
+        token_hashes = np.unique(token_hashes)
+        shingles.append(token_hashes)
+        lengths.append(len(token_hashes))
+
+    signatures = np.zeros((len(texts), len(PERMUTATION_A)), dtype=np.uint32)
+    lengths = np.array(lengths)
+    present = lengths > 0
+    if present.any():
+        values = np.concatenate(shingles)
+        with np.errstate(over="ignore"):
+            permuted = ((values[:, None] * PERMUTATION_A + PERMUTATION_B) >> np.uint64(32)).astype(np.uint32)
+        offsets = np.concatenate(([0], np.cumsum(lengths[present])[:-1]))
+        signatures[present] = np.minimum.reduceat(permuted, offsets, axis=0)
+    return signatures
+
+class NearDuplicateIndex:
+    """MinHash LSH index: signatures are split into bands, articles sharing any band are candidates,
+    and a candidate is a near-duplicate when its estimated Jaccard similarity reaches the threshold."""
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD, window_hours: float = NEAR_DUP_WINDOW_HOURS,
+                 bands: int = NEAR_DUP_BANDS, rows: int = NEAR_DUP_ROWS):
+        self.threshold = threshold
+        self.window_seconds = window_hours * 3600
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [{} for _ in range(bands)]
+        self.entries = {}
+        self.expiry = deque()
+
+    def _band_keys(self, signature: np.ndarray):
+        data = signature.tobytes()
+        width = self.rows * signature.itemsize
+        return [data[band * width:(band + 1) * width] for band in range(self.bands)]
+
+    def find(self, signature: np.ndarray, source_id: Optional[int] = None) -> Optional[int]:
+        candidates = set()
+        for buckets, key in zip(self.buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+
+        best_id, best_similarity = None, self.threshold
+        for article_id in candidates:
+            candidate_signature, candidate_source_id, canonical_id, _ = self.entries[article_id]
+            if source_id is not None and candidate_source_id == source_id:
+                continue
+            similarity = float(np.count_nonzero(candidate_signature == signature)) / len(signature)
+            if similarity > best_similarity or (similarity == best_similarity and (best_id is None or canonical_id < best_id)):
+                best_id, best_similarity = canonical_id, similarity
+        return best_id
+
+    def add(self, article_id: int, signature: np.ndarray, source_id: Optional[int],
+            canonical_id: Optional[int] = None, added_at: Optional[float] = None):
+        added_at = time.time() if added_at is None else added_at
+        self.expire(added_at)
+        self.entries[article_id] = (signature, source_id, canonical_id or article_id, added_at)
+        self.expiry.append((added_at, article_id))
+        for buckets, key in zip(self.buckets, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(article_id)
+
+    def expire(self, now: Optional[float] = None):
+        cutoff = (time.time() if now is None else now) - self.window_seconds
+        while self.expiry and self.expiry[0][0] < cutoff:
+            _, article_id = self.expiry.popleft()
+            self.remove(article_id)
+
+    def remove(self, article_id: int):
+        entry = self.entries.pop(article_id, None)
+        if entry is None:
+            return
+        for buckets, key in zip(self.buckets, self._band_keys(entry[0])):
+            bucket = buckets.get(key)
+            bucket.discard(article_id)
+            if not bucket:
+                del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+def article_text(article: Dict) -> str:
+    return f"{article['title']} {article['summary']}" if article.get('summary') else article['title']
+
+_index = None
+_index_lock = None
+
+async def get_index() -> NearDuplicateIndex:
+    global _index, _index_lock
+    if _index is not None:
+        return _index
+    if _index_lock is None:
+        _index_lock = asyncio.Lock()
+    async with _index_lock:
+        if _index is None:
+            _index = await rebuild()
+    return _index
+
+async def rebuild() -> NearDuplicateIndex:
+    index = NearDuplicateIndex()
+    since = datetime.now(timezone.utc) - timedelta(hours=NEAR_DUP_WINDOW_HOURS)
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        rows = await crud.get_recent_articles_for_dedup(db, since)
+    signatures = minhashes([article_text(row._mapping) for row in rows])
+    for row, signature in zip(rows, signatures):
+        if not signature.any():
+            continue
+        created_at = row.created_at.replace(tzinfo=row.created_at.tzinfo or timezone.utc).timestamp() \
+            if row.created_at else time.time()
+        index.add(row.id, signature, row.source_id, row.duplicate_of, created_at)
+    print(f"Near-duplicate index rebuilt with {len(index)} articles in {time.perf_counter() - started:.2f}s")
+    return index
+
+def forget(article_ids):
+    """Drops archived articles; copies that pointed at them become canonical like their database rows."""
+    if _index is None:
+        return
+    article_ids = set(article_ids)
+    for article_id in article_ids:
+        _index.remove(article_id)
+    for article_id, (signature, source_id, canonical_id, added_at) in list(_index.entries.items()):
+        if canonical_id in article_ids:
+            _index.entries[article_id] = (signature, source_id, article_id, added_at)
+
+async def mark_duplicates(source_id: int, articles: List[Dict]) -> Tuple[List[Dict], List[np.ndarray]]:
+    index = await get_index()
+    signatures = minhashes([article_text(article) for article in articles])
+    kept = []
+    kept_signatures = []
+    for article, signature in zip(articles, signatures):
+        duplicate_of = index.find(signature, source_id) if signature.any() else None
+        if duplicate_of is not None and NEAR_DUP_ACTION == "suppress":
+            continue
+        article['duplicate_of'] = duplicate_of
+        kept.append(article)
+        kept_signatures.append(signature)
+    return kept, kept_signatures
+
+async def index_articles(source_id: int, inserted: Sequence[Tuple[int, str]], articles: List[Dict],
+                         signatures: List[np.ndarray]):
+    index = await get_index()
+    by_url = {article['source_url']: (article, signature) for article, signature in zip(articles, signatures)}
+    for article_id, source_url in inserted:
+        article, signature = by_url[source_url]
+        if signature.any():
+            index.add(article_id, signature, source_id, article['duplicate_of'])
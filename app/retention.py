@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from app import content_store, crud, near_duplicates
+from app.database import AsyncSessionLocal, init_models
+from app.models import ArticleCategory
+
+RETENTION_POLICY_PATH = os.getenv("RETENTION_POLICY_PATH", "retention_policy.json")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "archive")
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_PAUSE_SECONDS = float(os.getenv("RETENTION_PAUSE_SECONDS", "0.5"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+PARTITION_CACHE_SIZE = 4
+
+_partitions = OrderedDict()
+
+def load_policy(path: str = RETENTION_POLICY_PATH) -> Dict:
+    """Policy file: {"default_days": 90, "categories": {"SPORTS": 30}, "sources": {"3": 0}}; 0 keeps forever."""
+    policy = {'default_days': RETENTION_DAYS, 'categories': {}, 'sources': {}}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as policy_file:
+            policy.update(json.load(policy_file))
+    return {
+        'default_days': int(policy['default_days'] or 0),
+        'categories': {ArticleCategory(name): int(days or 0) for name, days in policy['categories'].items()},
+        'sources': {int(source_id): int(days or 0) for source_id, days in policy['sources'].items()}
+    }
+
+def enabled(policy: Dict) -> bool:
+    days = [policy['default_days'], *policy['categories'].values(), *policy['sources'].values()]
+    return any(value > 0 for value in days)
+
+def _cutoff(days: int, now: datetime) -> Optional[datetime]:
+    return now - timedelta(days=days) if days > 0 else None
+
+def partition_of(article) -> str:
+    moment = article.published_at or article.created_at or datetime.now(timezone.utc)
+    return f"{moment:%Y-%m-%d}"
+
+def partition_path(partition: str, archive_dir: str = RETENTION_ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, partition[:4], partition[5:7], f"{partition}.jsonl.gz")
+
+def archive_record(article) -> Dict:
+    return {
+        'id': article.id,
+        'title': article.title,
+        'summary': article.summary,
+        'content': content_store.article_content(article),
+        'source_url': article.source_url,
+        'image_url': article.image_url,
+        'category': article.category.value if article.category else None,
+        'source_id': article.source_id,
+        'published_at': article.published_at.isoformat() if article.published_at else None,
+        'created_at': article.created_at.isoformat() if article.created_at else None
+    }
+
+def write_archive(records: Dict[str, List[Dict]], archive_dir: str = RETENTION_ARCHIVE_DIR):
+    """Appends one gzip member per partition; readers see a member only after its ids are committed."""
+    for partition, partition_records in records.items():
+        path = partition_path(partition, archive_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as archive_file:
+            with gzip.GzipFile(fileobj=archive_file, mode="wb") as gzip_file:
+                for record in partition_records:
+                    gzip_file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+
+def load_partition(partition: str, archive_dir: str = RETENTION_ARCHIVE_DIR) -> Dict[int, Dict]:
+    path = partition_path(partition, archive_dir)
+    mtime = os.path.getmtime(path)
+    cached = _partitions.get(path)
+    if cached is not None and cached[0] == mtime:
+        _partitions.move_to_end(path)
+        return cached[1]
+
+    records = {}
+    with gzip.open(path, "rb") as archive_file:
+        try:
+            for line in archive_file:
+                record = json.loads(line)
+                records[record['id']] = record
+        except (EOFError, gzip.BadGzipFile):
+            pass
+    _partitions[path] = (mtime, records)
+    if len(_partitions) > PARTITION_CACHE_SIZE:
+        _partitions.popitem(last=False)
+    return records
+
+async def read_archived(db, article_id: int) -> Optional[Dict]:
+    partition = await crud.get_archived_partition(db, article_id)
+    if partition is None:
+        return None
+    try:
+        records = await asyncio.to_thread(load_partition, partition)
+    except FileNotFoundError:
+        return None
+    record = records.get(article_id)
+    return dict(record, archived=True) if record is not None else None
+
+async def archive_expired(policy: Optional[Dict] = None, batch_size: int = RETENTION_BATCH_SIZE,
+                          pause_seconds: float = RETENTION_PAUSE_SECONDS) -> int:
+    policy = policy or load_policy()
+    if not enabled(policy):
+        return 0
+    now = datetime.now(timezone.utc)
+    source_cutoffs = {source_id: _cutoff(days, now) for source_id, days in policy['sources'].items()}
+    category_cutoffs = {category: _cutoff(days, now) for category, days in policy['categories'].items()}
+    default_cutoff = _cutoff(policy['default_days'], now)
+
+    archived = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            articles = await crud.get_expired_articles(db, source_cutoffs, category_cutoffs, default_cutoff, batch_size)
+            if not articles:
+                break
+            records = defaultdict(list)
+            partitions = {}
+            for article in articles:
+                partition = partition_of(article)
+                records[partition].append(archive_record(article))
+                partitions[article.id] = partition
+            await asyncio.to_thread(write_archive, records)
+            await crud.delete_archived_articles(db, partitions)
+        near_duplicates.forget(partitions)
+        archived += len(partitions)
+        print(f"Archived {archived} expired articles")
+        await asyncio.sleep(pause_seconds)
+    return archived
+
+async def run():
+    while True:
+        try:
+            await archive_expired()
+        except Exception as e:
+            print(f"Error archiving expired articles: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+async def main(batch_size: int, pause_seconds: float):
+    await init_models()
+    await archive_expired(batch_size=batch_size, pause_seconds=pause_seconds)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Archive articles past their retention period")
+    arg_parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    arg_parser.add_argument("--pause", type=float, default=RETENTION_PAUSE_SECONDS)
+    args = arg_parser.parse_args()
+    asyncio.run(main(args.batch_size, args.pause))
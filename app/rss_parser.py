@@ -1,122 +1,347 @@
 import aiohttp
-import feedparser
-from datetime import datetime
-from typing import List, Dict
+import asyncio
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Tuple
+from urllib.parse import urlparse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app import crud, schemas
-from app.models import ArticleCategory, Article
+from app import crud, circuit_breaker, content_store, feed_parsers, fetch_metrics, http_client, \
+    near_duplicates, vector_categorizer
+from app.feed_stream import StreamingFeedParser
+from app.models import Article, NewsSource
+from app.urls import canonicalize, url_hash
+
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "20"))
+FETCH_PER_HOST_LIMIT = int(os.getenv("FETCH_PER_HOST_LIMIT", "2"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "2"))
+STREAM_FEEDS = os.getenv("STREAM_FEEDS", "false").lower() == "true"
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "16384"))
+
+def content_hash(content: bytes = b""):
+    return hashlib.blake2b(content, digest_size=16)
+
+def parse_entries(content: bytes, last_entry_id: Optional[str] = None,
+                  last_published_at: Optional[datetime] = None,
+                  parser_name: Optional[str] = None) -> Tuple[List[Dict], str]:
+    entries, parser_name = feed_parsers.parse(content, parser_name)
+    return feed_parsers.select_new_entries(entries, last_entry_id, last_published_at), parser_name
+
+def parse_feed_content_timed(content: bytes, last_entry_id: Optional[str] = None,
+                             last_published_at: Optional[datetime] = None,
+                             parser_name: Optional[str] = None) -> Tuple[List[Dict], str, float, float]:
+    started = time.perf_counter()
+    articles, parser_name = parse_entries(content, last_entry_id, last_published_at, parser_name)
+    parsed = time.perf_counter()
+    categorize_articles(articles)
+    return articles, parser_name, parsed - started, time.perf_counter() - parsed
+
+def _naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment and moment.tzinfo:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def categorize_articles(articles: List[Dict]) -> List[Dict]:
+    categories = vector_categorizer.categorize_batch(
+        [article['title'] for article in articles],
+        [article['summary'] for article in articles]
+    )
+    for article, category in zip(articles, categories):
+        article['category'] = category
+    return articles
 
 class RSSParser:
-    def __init__(self):
-        self.session = None
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, per_host_limit: int = FETCH_PER_HOST_LIMIT,
+                 parse_workers: int = PARSE_WORKERS, stream: bool = STREAM_FEEDS):
+        self.http = http_client.HTTPClient()
+        self.stream = stream
+        self.executor = None
+        self.parse_workers = parse_workers
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self._total_limit = None
+        self._host_limits = {}
 
     async def _get_session(self):
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
+        return await self.http.get_session()
+
+    @asynccontextmanager
+    async def _limit(self, url: str):
+        if self._total_limit is None:
+            self._total_limit = asyncio.Semaphore(self.concurrency)
+        host = urlparse(url).hostname or ""
+        host_limit = self._host_limits.get(host)
+        if host_limit is None:
+            host_limit = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        async with host_limit:
+            async with self._total_limit:
+                yield
 
     async def close(self):
-        if self.session and not self.session.closed:
-            await self.session.close()
-
-    def _categorize_article(self, title: str, summary: str = "") -> ArticleCategory:
-        text_content = (title + " " + summary).lower()
-        category_keywords = {
-            ArticleCategory.POLITICS: ['выборы', 'президент', 'правительство', 'политика', 'путин', 'депутат'],
-            ArticleCategory.TECHNOLOGY: ['технология', 'искусственный интеллект', 'стартап', 'гаджет',
-                                         'программирование', 'it', 'смартфон'],
-            ArticleCategory.SPORTS: ['футбол', 'хоккей', 'соревнование', 'олимпиада', 'спортсмен', 'чемпионат'],
-            ArticleCategory.BUSINESS: ['бизнес', 'экономика', 'рынок', 'акции', 'компания', 'финансы'],
-            ArticleCategory.ENTERTAINMENT: ['кино', 'сериал', 'музыка', 'знаменитость', 'концерт'],
-            ArticleCategory.SCIENCE: ['наука', 'исследование', 'открытие', 'ученый', 'космос'],
-            ArticleCategory.HEALTH: ['здоровье', 'медицина', 'врач', 'лекарство', 'болезнь']
-        }
+        await self.http.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def fetch_feed(self, rss_url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                         last_entry_id: Optional[str] = None, stream: bool = False,
+                         metrics: Optional[Dict] = None, last_published_at: Optional[datetime] = None) -> Dict:
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        if metrics is None:
+            metrics = fetch_metrics.new_record(None)
+        session = await self._get_session()
+        timings = {}
+        async with self._limit(rss_url):
+            started = time.perf_counter()
+            processing_before = metrics['parse_ms'] + metrics['categorize_ms']
+            try:
+                async with session.get(rss_url, headers=headers, timeout=aiohttp.ClientTimeout(total=10),
+                                       trace_request_ctx=timings) as response:
+                    metrics['status'] = response.status
+                    if response.status == 304:
+                        return {'status': 304, 'content': None, 'entries': None, 'content_hash': None,
+                            'parser': None, 'etag': etag, 'last_modified': last_modified}
+                    response.raise_for_status()
+                    response_data = {
+                        'status': response.status,
+                        'content': None,
+                        'entries': None,
+                        'content_hash': None,
+                        'parser': None,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')
+                    }
+                    if stream:
+                        response_data['entries'], response_data['content_hash'] = await self._stream_entries(
+                            response, last_entry_id, metrics, last_published_at
+                        )
+                        response_data['parser'] = 'stream'
+                    else:
+                        response_data['content'] = await self.http.read_body(response)
+                        response_data['content_hash'] = content_hash(response_data['content']).hexdigest()
+                        metrics['bytes_received'] += len(response_data['content'])
+                    return response_data
+            finally:
+                connect = self.http.connect_seconds(timings)
+                processing = metrics['parse_ms'] + metrics['categorize_ms'] - processing_before
+                metrics['connect_ms'] += connect * 1000
+                metrics['download_ms'] += (time.perf_counter() - started - connect) * 1000 - processing
 
-        scores = {category: 0 for category in ArticleCategory}
-        for category, keywords in category_keywords.items():
-            for keyword in keywords:
-                if keyword in text_content:
-                    scores[category] += 1
+    async def _stream_entries(self, response, last_entry_id: Optional[str] = None, metrics: Optional[Dict] = None,
+                              last_published_at: Optional[datetime] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Parses chunks off the event loop and stops downloading once the last seen entry arrives."""
+        if metrics is None:
+            metrics = fetch_metrics.new_record(None)
+        parser = StreamingFeedParser()
+        hasher = content_hash()
+        entries = []
+        reached_seen = False
+        async for chunk in self.http.iter_body(response, STREAM_CHUNK_SIZE):
+            metrics['bytes_received'] += len(chunk)
+            hasher.update(chunk)
+            started = time.perf_counter()
+            entries.extend(await asyncio.to_thread(parser.feed, chunk))
+            metrics['parse_ms'] += (time.perf_counter() - started) * 1000
+            # in an oldest-first feed the new entries follow the seen one, so keep reading
+            if last_entry_id and any(entry['entry_id'] == last_entry_id for entry in entries) \
+                    and not feed_parsers.is_oldest_first(entries):
+                reached_seen = True
+                break
+        if not reached_seen:
+            started = time.perf_counter()
+            entries.extend(await asyncio.to_thread(parser.close))
+            metrics['parse_ms'] += (time.perf_counter() - started) * 1000
 
-        if max(scores.values()) > 0:
-            return max(scores, key=scores.get)
-        return ArticleCategory.GENERAL
+        articles = feed_parsers.select_new_entries(entries, last_entry_id, last_published_at)
+        started = time.perf_counter()
+        executor = self._get_executor()
+        if executor is None or not articles:
+            categorize_articles(articles)
+        else:
+            articles = await asyncio.get_running_loop().run_in_executor(executor, categorize_articles, articles)
+        metrics['categorize_ms'] += (time.perf_counter() - started) * 1000
+        return articles, None if reached_seen else hasher.hexdigest()
+
+    def _get_executor(self):
+        if self.executor is None and self.parse_workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        return self.executor
+
+    async def _parse_content(self, content: bytes, last_entry_id: Optional[str] = None,
+                             last_published_at: Optional[datetime] = None, parser_name: Optional[str] = None,
+                             metrics: Optional[Dict] = None) -> Tuple[List[Dict], str]:
+        executor = self._get_executor()
+        if executor is None:
+            articles, parser_name, parse_seconds, categorize_seconds = parse_feed_content_timed(
+                content, last_entry_id, last_published_at, parser_name
+            )
+        else:
+            articles, parser_name, parse_seconds, categorize_seconds = await asyncio.get_running_loop().run_in_executor(
+                executor, parse_feed_content_timed, content, last_entry_id, last_published_at, parser_name
+            )
+        if metrics is not None:
+            metrics['parse_ms'] += parse_seconds * 1000
+            metrics['categorize_ms'] += categorize_seconds * 1000
+        return articles, parser_name
 
     async def parse_feed(self, rss_url: str) -> List[Dict]:
-        session = await self._get_session()
         try:
-            async with session.get(rss_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                response.raise_for_status()
-                content = await response.text()
-            feed = feedparser.parse(content)
-            articles = []
-            for entry in feed.entries[:10]:
-                published = None
-                if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                    published = datetime(*entry.published_parsed[:6])
-
-                article_data = {
-                    'title': entry.title if hasattr(entry, 'title') else '',
-                    'summary': entry.summary if hasattr(entry, 'summary') else '',
-                    'content': entry.description if hasattr(entry, 'description') else '',
-                    'source_url': entry.link if hasattr(entry, 'link') else '',
-                    'image_url': None,
-                    'published_at': published,
-                    'category': self._categorize_article(
-                        entry.title if hasattr(entry, 'title') else '',
-                        entry.summary if hasattr(entry, 'summary') else ''
-                    )
-                }
-
-                if hasattr(entry, 'media_content'):
-                    for media in entry.media_content:
-                        if media.get('type', '').startswith('image'):
-                            article_data['image_url'] = media.get('url')
-                            break
-
-                articles.append(article_data)
-            return articles
+            response_data = await self.fetch_feed(rss_url)
+            return (await self._parse_content(response_data['content']))[0]
         except Exception as e:
             print(f"Error parsing RSS feed {rss_url}: {e}")
             return []
 
-    async def parse_and_save_articles(self, db: AsyncSession, source_id: int, rss_url: str) -> int:
-        articles_data = await self.parse_feed(rss_url)
-        if not articles_data:
-            return 0
-        
-        saved_count = 0
-        
-        source_urls = [article_data['source_url'] for article_data in articles_data]
-        if source_urls:
-            existing_result = await db.execute(
-                select(Article.source_url).where(Article.source_url.in_(source_urls))
-            )
-            existing_urls = {row[0] for row in existing_result}
-        else:
-            existing_urls = set()
+    async def parse_and_save_articles(self, db: AsyncSession, source: NewsSource) -> int:
+        metrics = fetch_metrics.new_record(source.id)
+        started = time.perf_counter()
+        try:
+            return await self._parse_and_save(db, source, metrics)
+        finally:
+            metrics['total_ms'] = (time.perf_counter() - started) * 1000
+            fetch_metrics.record(metrics)
 
-        for article_data in articles_data:
+    async def _parse_and_save(self, db: AsyncSession, source: NewsSource, metrics: Dict) -> int:
+        # with a stored hash the body is buffered first, so an unchanged feed is never parsed or categorized
+        stream = self.stream and source.parser in (None, 'stream') and not source.content_hash
+        try:
             try:
-                if article_data['source_url'] in existing_urls:
-                    continue
-
-                article = schemas.ArticleCreate(
-                    title=article_data['title'][:500],
-                    summary=article_data['summary'][:1000] if article_data['summary'] else None,
-                    content=article_data['content'][:5000] if article_data['content'] else '',
-                    source_url=article_data['source_url'][:500],
-                    image_url=article_data['image_url'][:500] if article_data['image_url'] else None,
-                    category=article_data['category'],
-                    source_id=source_id,
-                    published_at=article_data['published_at']
+                response_data = await self.fetch_feed(
+                    source.url, source.etag, source.last_modified, source.last_entry_id, stream=stream,
+                    metrics=metrics, last_published_at=_naive_utc(source.last_published_at)
                 )
+            except (ET.ParseError, ValueError) as e:
+                if not stream:
+                    raise
+                print(f"Falling back to buffered parsing for {source.url}: {e}")
+                response_data = await self.fetch_feed(source.url, source.etag, source.last_modified, metrics=metrics)
+        except Exception as e:
+            print(f"Error parsing RSS feed {source.url}: {e}")
+            await self._record_failure(db, source, e, metrics)
+            return 0
+        return await self._process_response(db, source, response_data, metrics)
+
+    async def save_pushed_content(self, db: AsyncSession, source: NewsSource, content: bytes) -> int:
+        metrics = fetch_metrics.new_record(source.id)
+        metrics['status'] = 200
+        metrics['bytes_received'] = len(content)
+        started = time.perf_counter()
+        response_data = {
+            'status': 200,
+            'content': content,
+            'entries': None,
+            'content_hash': content_hash(content).hexdigest(),
+            'parser': None,
+            'etag': source.etag,
+            'last_modified': source.last_modified
+        }
+        try:
+            return await self._process_response(db, source, response_data, metrics)
+        finally:
+            metrics['total_ms'] = (time.perf_counter() - started) * 1000
+            fetch_metrics.record(metrics)
 
-                await crud.create_article(db, article)
-                saved_count += 1
+    async def _process_response(self, db: AsyncSession, source: NewsSource, response_data: Dict, metrics: Dict) -> int:
+        unchanged = response_data['content_hash'] is not None and response_data['content_hash'] == source.content_hash
+        if response_data['status'] == 304 or unchanged:
+            if source.failure_count or source.retry_at:
+                await self._record_success(db, source)
+            return 0
+
+        last_published_at = _naive_utc(source.last_published_at)
+        if response_data['entries'] is not None:
+            articles_data = response_data['entries']
+        else:
+            try:
+                articles_data, response_data['parser'] = await self._parse_content(
+                    response_data['content'], source.last_entry_id, last_published_at, source.parser, metrics
+                )
             except Exception as e:
-                print(f"Error saving article: {e}")
-                continue
+                print(f"Error parsing RSS feed {source.url}: {e}")
+                await self._record_failure(db, source, e, metrics)
+                return 0
 
+        started = time.perf_counter()
+        saved_count = await self.save_articles(db, source.id, articles_data)
+        metrics['entries'] = len(articles_data)
+        metrics['new_items'] = saved_count
+        metrics['duplicates'] = len(articles_data) - saved_count
+
+        values = {
+            'etag': response_data['etag'],
+            'last_modified': response_data['last_modified'],
+            'content_hash': response_data['content_hash'],
+            'parser': response_data['parser'],
+            'last_fetch': datetime.now(timezone.utc),
+            **circuit_breaker.success_values(source)
+        }
+        if articles_data:
+            values['last_entry_id'] = feed_parsers.newest_entry(articles_data)['entry_id']
+            published = [a['published_at'] for a in articles_data if a['published_at']]
+            if published:
+                newest = max(published + ([last_published_at] if last_published_at else []))
+                values['last_published_at'] = newest.replace(tzinfo=timezone.utc)
+        await crud.update_news_source(db, source.id, **values)
+        metrics['db_ms'] = (time.perf_counter() - started) * 1000
+        circuit_breaker.apply(source, values)
         return saved_count
+
+    async def _record_failure(self, db: AsyncSession, source: NewsSource, error: Exception,
+                              metrics: Optional[Dict] = None):
+        values = circuit_breaker.failure_values(source, error)
+        if metrics is not None:
+            metrics['error'] = values['last_error']
+        await crud.update_news_source(db, source.id, **values)
+        circuit_breaker.apply(source, values)
+        if values.get('is_active') is False:
+            print(f"Deactivated {source.name} after {values['failure_count']} consecutive failures")
+
+    async def _record_success(self, db: AsyncSession, source: NewsSource):
+        values = circuit_breaker.success_values(source)
+        await crud.update_news_source(db, source.id, **values)
+        circuit_breaker.apply(source, values)
+
+    async def save_articles(self, db: AsyncSession, source_id: int, articles_data: List[Dict]) -> int:
+        articles = {}
+        for article_data in articles_data:
+            if not article_data['source_url']:
+                continue
+            key = url_hash(article_data['source_url'])
+            if key in articles:
+                continue
+            articles[key] = content_store.pack({
+                'title': article_data['title'][:500],
+                'summary': article_data['summary'][:1000] if article_data['summary'] else None,
+                'content': article_data['content'][:5000] if article_data['content'] else '',
+                'source_url': canonicalize(article_data['source_url'])[:500],
+                'url_hash': key,
+                'image_url': article_data['image_url'][:500] if article_data['image_url'] else None,
+                'category': article_data['category'],
+                'source_id': source_id,
+                'published_at': article_data['published_at']
+            })
+        if not articles:
+            return 0
+
+        existing_result = await db.execute(
+            select(Article.url_hash).where(Article.url_hash.in_(list(articles)))
+        )
+        for row in existing_result:
+            articles.pop(row[0], None)
+        if not near_duplicates.NEAR_DUP_ENABLED:
+            return await crud.bulk_create_articles(db, list(articles.values()))
+
+        rows, signatures = await near_duplicates.mark_duplicates(source_id, list(articles.values()))
+        inserted = await crud.bulk_insert_articles(db, rows)
+        await near_duplicates.index_articles(source_id, inserted, rows, signatures)
+        return len(inserted)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -52,6 +52,13 @@ class ArticleBase(BaseModel):
 class ArticleCreate(ArticleBase):
     pass
 
+class CategoryCorrectionCreate(BaseModel):
+    category: ArticleCategory
+
+class CategoryKeywordsUpdate(BaseModel):
+    version: Optional[int] = None
+    categories: Dict[ArticleCategory, Dict[str, float]]
+
 class ArticleFilter(BaseModel):
     category: Optional[ArticleCategory] = None
     source_id: Optional[int] = None
@@ -0,0 +1,34 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "dclid", "msclkid", "mc_cid", "mc_eid", "_openstat"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def canonicalize(url: str) -> str:
+    """Drops tracking parameters, fragments and default ports and lowercases scheme and host."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    netloc = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(sorted(query)), ""))
+
+def url_hash(url: str) -> int:
+    """Signed 64-bit dedup key of the canonical URL; http and https variants share a key."""
+    key = canonicalize(url)
+    scheme, separator, rest = key.partition("://")
+    if separator and scheme in DEFAULT_PORTS:
+        key = rest
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
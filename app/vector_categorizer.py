@@ -0,0 +1,184 @@
+import os
+import re
+import zlib
+from typing import Callable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from app import categorizer
+from app.categorizer import WORD_RE, KeywordCategorizer
+from app.models import ArticleCategory
+
+CATEGORIES = tuple(ArticleCategory)
+BATCH_SIZE = 5000
+CATEGORIZER_MODES = ("keywords", "nb", "combined")
+CATEGORIZER = os.getenv("CATEGORIZER", "combined").lower()
+KEYWORD_PRIOR_WEIGHT = float(os.getenv("KEYWORD_PRIOR_WEIGHT", "1"))
+
+NGRAM_MULTIPLIER = np.uint64(0x9E3779B1)
+HASH_MASK = np.uint64(0xFFFFFFFF)
+DOCUMENT_SEPARATOR = "\x1e"
+TOKEN_OR_SEPARATOR_RE = re.compile(WORD_RE.pattern + "|" + DOCUMENT_SEPARATOR)
+
+def hash_token(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+def combine_hashes(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    return ((left.astype(np.uint64) * NGRAM_MULTIPLIER + right.astype(np.uint64)) & HASH_MASK).astype(np.uint32)
+
+def hash_phrase(phrase: str) -> int:
+    tokens = WORD_RE.findall(phrase.lower())
+    feature = np.array([hash_token(tokens[0])], dtype=np.uint32)
+    for token in tokens[1:]:
+        feature = combine_hashes(feature, np.array([hash_token(token)], dtype=np.uint32))
+    return int(feature[0])
+
+def hashed_features(texts: Sequence[str], ngram: int = 1, normalize: Optional[Callable[[str], str]] = None):
+    tokens = TOKEN_OR_SEPARATOR_RE.findall(DOCUMENT_SEPARATOR.join(texts).lower())
+    separators = np.fromiter(map(DOCUMENT_SEPARATOR.__eq__, tokens), dtype=bool, count=len(tokens))
+    doc_ids = np.cumsum(separators)[~separators]
+    tokens = [token for token in tokens if token != DOCUMENT_SEPARATOR]
+    token_hashes = {token: hash_token(normalize(token) if normalize else token) for token in dict.fromkeys(tokens)}
+    hashes = np.fromiter(map(token_hashes.__getitem__, tokens), dtype=np.uint32, count=len(tokens))
+
+    all_doc_ids = [doc_ids]
+    all_hashes = [hashes]
+    gram_hashes, gram_doc_ids = hashes, doc_ids
+    for _ in range(2, ngram + 1):
+        same_doc = gram_doc_ids[:-1] == doc_ids[len(doc_ids) - len(gram_doc_ids) + 1:]
+        gram_hashes = combine_hashes(gram_hashes[:-1], hashes[len(hashes) - len(gram_hashes) + 1:])
+        gram_doc_ids = gram_doc_ids[:-1]
+        all_doc_ids.append(gram_doc_ids[same_doc])
+        all_hashes.append(gram_hashes[same_doc])
+    return np.concatenate(all_doc_ids), np.concatenate(all_hashes)
+
+class HashedLinearModel:
+    def __init__(self, feature_ids: Optional[np.ndarray], weights: np.ndarray, bias: Optional[np.ndarray] = None,
+                 ngram: int = 1, binary: bool = False, fallback: Optional[ArticleCategory] = None,
+                 buckets: Optional[int] = None, normalize: Optional[Callable[[str], str]] = None):
+        self.buckets = buckets
+        self.normalize = normalize
+        if buckets is None:
+            order = np.argsort(feature_ids, kind="stable")
+            self.feature_ids = np.asarray(feature_ids, dtype=np.uint32)[order]
+            self.weights = np.asarray(weights)[order]
+        else:
+            self.feature_ids = None
+            self.weights = np.asarray(weights)
+        self.bias = np.zeros(len(CATEGORIES)) if bias is None else np.asarray(bias, dtype=np.float64)
+        self.ngram = ngram
+        self.binary = binary
+        self.fallback = fallback
+
+    @classmethod
+    def from_keyword_categorizer(cls, categorizer: KeywordCategorizer) -> "HashedLinearModel":
+        keywords = list(categorizer.keyword_weights)
+        feature_ids = np.array([hash_phrase(" ".join(categorizer.keyword_units[keyword])) for keyword in keywords],
+                               dtype=np.uint32)
+        unique_ids, positions = np.unique(feature_ids, return_inverse=True)
+        weights = np.zeros((len(unique_ids), len(CATEGORIES)))
+        for position, keyword in zip(positions, keywords):
+            for category, weight in categorizer.keyword_weights[keyword].items():
+                weights[position, CATEGORIES.index(category)] += weight
+        ngram = max((keyword.count(" ") + 1 for keyword in keywords), default=1)
+        return cls(unique_ids, weights, ngram=ngram, binary=True, fallback=ArticleCategory.GENERAL,
+                   normalize=categorizer.normalize_token)
+
+    def feature_matrix(self, texts: Sequence[str]):
+        doc_ids, hashes = hashed_features(texts, self.ngram, self.normalize)
+        if not len(hashes) or not len(self.weights):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+
+        if self.buckets is not None:
+            rows, columns = doc_ids, (hashes % self.buckets).astype(np.int64)
+        else:
+            positions = np.searchsorted(self.feature_ids, hashes)
+            positions[positions == len(self.feature_ids)] = 0
+            known = self.feature_ids[positions] == hashes
+            rows, columns = doc_ids[known], positions[known].astype(np.int64)
+
+        if not self.binary:
+            return rows, columns, np.ones(len(rows))
+        width = len(self.weights)
+        keys = np.unique(rows * width + columns)
+        return keys // width, keys % width, np.ones(len(keys))
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        rows, columns, values = self.feature_matrix(texts)
+        scores = np.tile(self.bias, (len(texts), 1))
+        for index in range(len(CATEGORIES)):
+            scores[:, index] += np.bincount(rows, weights=self.weights[columns, index] * values, minlength=len(texts))
+        return scores
+
+    def predict_indexes(self, texts: Sequence[str]) -> np.ndarray:
+        scores = self.decision_function(texts)
+        predicted = scores.argmax(axis=1)
+        if self.fallback is not None:
+            predicted[scores.max(axis=1) <= 0] = CATEGORIES.index(self.fallback)
+        return predicted
+
+    def predict(self, texts: Sequence[str], batch_size: int = BATCH_SIZE) -> List[ArticleCategory]:
+        categories = []
+        for start in range(0, len(texts), batch_size):
+            categories.extend(CATEGORIES[index] for index in self.predict_indexes(texts[start:start + batch_size]))
+        return categories
+
+class KeywordPriorModel:
+    """Naive Bayes scores plus weighted keyword scores, so dictionary edits still move predictions."""
+
+    def __init__(self, model: HashedLinearModel, keywords: HashedLinearModel, weight: float = KEYWORD_PRIOR_WEIGHT):
+        self.model = model
+        self.keywords = keywords
+        self.weight = weight
+
+    def predict(self, texts: Sequence[str], batch_size: int = BATCH_SIZE) -> List[ArticleCategory]:
+        categories = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            scores = self.model.decision_function(batch) + self.weight * self.keywords.decision_function(batch)
+            categories.extend(CATEGORIES[index] for index in scores.argmax(axis=1))
+        return categories
+
+_keyword_model = None
+_keyword_source = None
+_combined_model = None
+
+def keyword_model() -> HashedLinearModel:
+    global _keyword_model, _keyword_source
+    keyword_categorizer = categorizer.get_categorizer()
+    if _keyword_source is not keyword_categorizer:
+        _keyword_model = HashedLinearModel.from_keyword_categorizer(keyword_categorizer)
+        _keyword_source = keyword_categorizer
+    return _keyword_model
+
+def active_categorizer() -> str:
+    """CATEGORIZER=keywords|nb|combined; without a trained model only the keywords are live."""
+    from app import naive_bayes
+    mode = CATEGORIZER if CATEGORIZER in CATEGORIZER_MODES else "combined"
+    if mode != "keywords" and naive_bayes.get_model() is None:
+        return "keywords"
+    return mode
+
+def default_model() -> Union[HashedLinearModel, KeywordPriorModel]:
+    global _combined_model
+    from app import naive_bayes
+    mode = active_categorizer()
+    if mode == "keywords":
+        return keyword_model()
+    trained_model = naive_bayes.get_model().linear_model()
+    if mode == "nb":
+        return trained_model
+    keywords = keyword_model()
+    combined = _combined_model
+    if combined is None or combined.model is not trained_model or combined.keywords is not keywords:
+        _combined_model = KeywordPriorModel(trained_model, keywords)
+    return _combined_model
+
+def categorize_batch(titles: Sequence[str], summaries: Optional[Sequence[Optional[str]]] = None,
+                     model: Optional[Union[HashedLinearModel, KeywordPriorModel]] = None) -> List[ArticleCategory]:
+    if summaries is None:
+        texts = list(titles)
+    else:
+        texts = [f"{title} {summary}" if summary else title for title, summary in zip(titles, summaries)]
+    return (model or default_model()).predict(texts)
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from app import circuit_breaker, crud, fetch_metrics, rss_parser
+from app.database import AsyncSessionLocal
+from app.feed_stream import ATOM_NS
+from app.http_client import HTTPClient
+
+WEBSUB_CALLBACK_BASE_URL = os.getenv("WEBSUB_CALLBACK_BASE_URL", "").rstrip("/")
+WEBSUB_LEASE_SECONDS = int(os.getenv("WEBSUB_LEASE_SECONDS", str(7 * 24 * 3600)))
+WEBSUB_MAX_LEASE_SECONDS = int(os.getenv("WEBSUB_MAX_LEASE_SECONDS", str(30 * 24 * 3600)))
+WEBSUB_VERIFY_WINDOW_SECONDS = int(os.getenv("WEBSUB_VERIFY_WINDOW_SECONDS", "3600"))
+WEBSUB_RENEW_BEFORE_SECONDS = int(os.getenv("WEBSUB_RENEW_BEFORE_SECONDS", str(12 * 3600)))
+WEBSUB_DISCOVERY_SECONDS = int(os.getenv("WEBSUB_DISCOVERY_SECONDS", str(24 * 3600)))
+WEBSUB_RETRY_SECONDS = int(os.getenv("WEBSUB_RETRY_SECONDS", "3600"))
+WEBSUB_MAINTAIN_SECONDS = int(os.getenv("WEBSUB_MAINTAIN_SECONDS", "600"))
+WEBSUB_FALLBACK_POLL_SECONDS = int(os.getenv("WEBSUB_FALLBACK_POLL_SECONDS", str(6 * 3600)))
+DISCOVERY_MAX_BYTES = 65536
+
+SIGNATURE_ALGORITHMS = {
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'sha384': hashlib.sha384,
+    'sha512': hashlib.sha512
+}
+LINK_RE = re.compile(r'<([^>]*)>\s*((?:;\s*[^;,]*)*)')
+REL_RE = re.compile(r'rel\s*=\s*"?([^";]+)"?')
+
+def enabled() -> bool:
+    return bool(WEBSUB_CALLBACK_BASE_URL)
+
+def callback_url(source_id: int) -> str:
+    return f"{WEBSUB_CALLBACK_BASE_URL}/api/websub/{source_id}"
+
+def is_subscribed(source, now: Optional[datetime] = None) -> bool:
+    if not source.websub_lease_expires_at:
+        return False
+    return circuit_breaker.as_utc(source.websub_lease_expires_at) > (now or datetime.now(timezone.utc))
+
+def parse_link_headers(values: List[str]) -> Dict[str, str]:
+    links = {}
+    for value in values:
+        for url, params in LINK_RE.findall(value):
+            rel = REL_RE.search(params)
+            if rel:
+                for name in rel.group(1).split():
+                    links.setdefault(name.lower(), url.strip())
+    return links
+
+def parse_feed_links(content: bytes) -> Dict[str, str]:
+    links = {}
+    parser = ET.XMLPullParser(events=("start",))
+    try:
+        parser.feed(content[:DISCOVERY_MAX_BYTES])
+        for _, element in parser.read_events():
+            if element.tag in ("item", f"{ATOM_NS}entry"):
+                break
+            if element.tag in (f"{ATOM_NS}link", "link") and element.get("rel") and element.get("href"):
+                links.setdefault(element.get("rel").lower(), element.get("href"))
+    except ET.ParseError:
+        pass
+    return links
+
+def discover(link_headers: List[str], content: bytes) -> Tuple[Optional[str], Optional[str]]:
+    links = {**parse_feed_links(content), **parse_link_headers(link_headers)}
+    return links.get('hub'), links.get('self')
+
+def verify_signature(secret: Optional[str], body: bytes, signature: Optional[str]) -> bool:
+    if not secret or not signature or "=" not in signature:
+        return False
+    method, digest = signature.split("=", 1)
+    algorithm = SIGNATURE_ALGORITHMS.get(method.lower())
+    if algorithm is None:
+        return False
+    expected = hmac.new(secret.encode(), body, algorithm).hexdigest()
+    return hmac.compare_digest(expected, digest.strip().lower())
+
+async def discover_source(http: HTTPClient, source) -> Tuple[Optional[str], Optional[str]]:
+    session = await http.get_session()
+    async with session.get(source.url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+        response.raise_for_status()
+        content = b""
+        async for chunk in http.iter_body(response):
+            content += chunk
+            if len(content) >= DISCOVERY_MAX_BYTES:
+                break
+        hub, topic = discover(response.headers.getall('Link', []), content)
+    return hub, topic or source.url
+
+def lease_duration(lease_seconds: Optional[int]) -> int:
+    if not lease_seconds or lease_seconds <= 0:
+        return WEBSUB_LEASE_SECONDS
+    return min(lease_seconds, WEBSUB_MAX_LEASE_SECONDS)
+
+def pending_matches(source, mode: str, topic: Optional[str], now: Optional[datetime] = None) -> bool:
+    """Only a verification for a request we sent, still within its window, is accepted."""
+    if source.websub_pending_mode != mode or source.websub_topic != topic or not source.websub_pending_until:
+        return False
+    return circuit_breaker.as_utc(source.websub_pending_until) > (now or datetime.now(timezone.utc))
+
+async def subscribe(http: HTTPClient, source, hub: str, topic: str, mode: str = "subscribe"):
+    secret = source.websub_secret or secrets.token_hex(20)
+    pending_until = datetime.now(timezone.utc) + timedelta(seconds=WEBSUB_VERIFY_WINDOW_SECONDS)
+    async with AsyncSessionLocal() as db:
+        await crud.update_news_source(
+            db, source.id, websub_hub=hub, websub_topic=topic, websub_secret=secret,
+            websub_pending_mode=mode, websub_pending_until=pending_until
+        )
+    source.websub_hub, source.websub_topic, source.websub_secret = hub, topic, secret
+    source.websub_pending_mode, source.websub_pending_until = mode, pending_until
+
+    session = await http.get_session()
+    data = {
+        'hub.mode': mode,
+        'hub.topic': topic,
+        'hub.callback': callback_url(source.id),
+        'hub.secret': secret,
+        'hub.lease_seconds': str(WEBSUB_LEASE_SECONDS)
+    }
+    async with session.post(hub, data=data, timeout=aiohttp.ClientTimeout(total=10)) as response:
+        if response.status not in (202, 204):
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status,
+                message=f"hub rejected {mode}: {(await response.text())[:200]}"
+            )
+
+async def verify_intent(source_id: int, mode: str, topic: str, lease_seconds: Optional[int]) -> bool:
+    async with AsyncSessionLocal() as db:
+        source = await crud.get_news_source(db, source_id)
+        if source is None or not pending_matches(source, mode, topic):
+            return False
+        if mode == "subscribe":
+            if not source.is_active:
+                return False
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=lease_duration(lease_seconds))
+            await crud.update_news_source(
+                db, source_id, websub_lease_expires_at=expires_at,
+                websub_pending_mode=None, websub_pending_until=None
+            )
+            return True
+        if mode == "unsubscribe":
+            await crud.update_news_source(
+                db, source_id, websub_lease_expires_at=None, websub_pending_mode=None, websub_pending_until=None
+            )
+            return True
+        return False
+
+async def subscription_denied(source_id: int, topic: Optional[str]) -> bool:
+    async with AsyncSessionLocal() as db:
+        source = await crud.get_news_source(db, source_id)
+        if source is None or not pending_matches(source, "subscribe", topic):
+            return False
+        await crud.update_news_source(
+            db, source_id, websub_hub=None, websub_lease_expires_at=None,
+            websub_pending_mode=None, websub_pending_until=None
+        )
+        return True
+
+_push_parser = None
+
+async def process_push(source_id: int, content: bytes) -> int:
+    global _push_parser
+    if _push_parser is None:
+        _push_parser = rss_parser.RSSParser()
+    async with AsyncSessionLocal() as db:
+        source = await crud.get_news_source(db, source_id)
+        if source is None:
+            return 0
+        saved = await _push_parser.save_pushed_content(db, source, content)
+    if saved > 0:
+        print(f"Saved {saved} pushed articles from {source.name}")
+    await fetch_metrics.flush()
+    return saved
+
+async def close():
+    global _push_parser
+    if _push_parser is not None:
+        await _push_parser.close()
+        _push_parser = None
+
+class WebSubManager:
+    def __init__(self, http: HTTPClient):
+        self.http = http
+        self.attempted_at = {}
+
+    def _recently_attempted(self, source_id: int, interval: int) -> bool:
+        attempted_at = self.attempted_at.get(source_id)
+        if attempted_at is not None and time.monotonic() - attempted_at < interval:
+            return True
+        self.attempted_at[source_id] = time.monotonic()
+        return False
+
+    def _needs_subscription(self, source, now: datetime) -> bool:
+        if not source.websub_hub:
+            return False
+        if not source.websub_lease_expires_at:
+            return True
+        return circuit_breaker.as_utc(source.websub_lease_expires_at) - now < timedelta(seconds=WEBSUB_RENEW_BEFORE_SECONDS)
+
+    async def maintain(self, sources):
+        now = datetime.now(timezone.utc)
+        for source in sources:
+            try:
+                if not source.websub_hub:
+                    if self._recently_attempted(source.id, WEBSUB_DISCOVERY_SECONDS):
+                        continue
+                    hub, topic = await discover_source(self.http, source)
+                    if hub is None:
+                        continue
+                    print(f"Discovered WebSub hub {hub} for {source.name}")
+                    await subscribe(self.http, source, hub, topic)
+                elif self._needs_subscription(source, now):
+                    if self._recently_attempted(source.id, WEBSUB_RETRY_SECONDS):
+                        continue
+                    await subscribe(self.http, source, source.websub_hub, source.websub_topic or source.url)
+            except Exception as e:
+                print(f"Error subscribing {source.name} via WebSub: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    sources = await crud.get_active_news_sources(db)
+                await self.maintain(sources)
+            except Exception as e:
+                print(f"Error maintaining WebSub subscriptions: {e}")
+            await asyncio.sleep(WEBSUB_MAINTAIN_SECONDS)
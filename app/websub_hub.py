@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import secrets
+from urllib.parse import urlencode
+
+import aiohttp
+from aiohttp import web
+
+class StandInHub:
+    """Minimal local WebSub hub for development: verifies intent and signs distributed content."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.session = None
+        self.tasks = set()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        return self.session
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _verify(self, mode: str, topic: str, callback: str, secret: str, lease_seconds: str):
+        challenge = secrets.token_hex(16)
+        query = {'hub.mode': mode, 'hub.topic': topic, 'hub.challenge': challenge}
+        if mode == "subscribe":
+            query['hub.lease_seconds'] = lease_seconds
+        separator = "&" if "?" in callback else "?"
+        session = await self._get_session()
+        try:
+            async with session.get(f"{callback}{separator}{urlencode(query)}") as response:
+                verified = response.status < 300 and (await response.text()) == challenge
+        except aiohttp.ClientError as e:
+            print(f"Verification of {callback} failed: {e}")
+            return
+        subscribers = self.subscriptions.setdefault(topic, {})
+        if not verified:
+            print(f"Callback {callback} did not confirm {mode} for {topic}")
+        elif mode == "subscribe":
+            subscribers[callback] = secret
+            print(f"Subscribed {callback} to {topic}")
+        else:
+            subscribers.pop(callback, None)
+            print(f"Unsubscribed {callback} from {topic}")
+
+    async def handle_subscription(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        mode, topic, callback = form.get('hub.mode'), form.get('hub.topic'), form.get('hub.callback')
+        if mode not in ("subscribe", "unsubscribe") or not topic or not callback:
+            return web.Response(status=400, text="hub.mode, hub.topic and hub.callback are required")
+        self._spawn(self._verify(mode, topic, callback, form.get('hub.secret', ''), form.get('hub.lease_seconds', '')))
+        return web.Response(status=202)
+
+    async def _distribute(self, topic: str) -> int:
+        session = await self._get_session()
+        async with session.get(topic) as response:
+            body = await response.read()
+            content_type = response.headers.get('Content-Type', 'application/xml')
+
+        delivered = 0
+        for callback, secret in list(self.subscriptions.get(topic, {}).items()):
+            headers = {'Content-Type': content_type}
+            if secret:
+                signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+                headers['X-Hub-Signature'] = f"sha256={signature}"
+            try:
+                async with session.post(callback, data=body, headers=headers) as response:
+                    delivered += response.status < 300
+            except aiohttp.ClientError as e:
+                print(f"Delivery to {callback} failed: {e}")
+        return delivered
+
+    async def handle_publish(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        topic = form.get('hub.url') or form.get('hub.topic')
+        if not topic:
+            return web.Response(status=400, text="hub.url is required")
+        delivered = await self._distribute(topic)
+        return web.json_response({'topic': topic, 'delivered': delivered})
+
+    async def close(self, app=None):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.session is not None:
+            await self.session.close()
+
+def create_app(hub: StandInHub = None) -> web.Application:
+    hub = hub or StandInHub()
+    app = web.Application()
+    app.router.add_post("/", hub.handle_subscription)
+    app.router.add_post("/publish", hub.handle_publish)
+    app.on_cleanup.append(hub.close)
+    return app
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Local stand-in WebSub hub for development")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8090)
+    args = arg_parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,70 @@
+import argparse
+import random
+import time
+
+from app.categorizer import DEFAULT_CATEGORY_KEYWORDS, KeywordCategorizer
+from app.models import ArticleCategory
+from app.vector_categorizer import HashedLinearModel
+
+FILLER_WORDS = [
+    'сегодня', 'москва', 'заявил', 'новый', 'проект', 'регион', 'итоги', 'года', 'эксперты', 'рассказали',
+    'граница', 'питание', 'критика', 'власти', 'город', 'жители', 'решение', 'неделя', 'столица', 'работа'
+]
+
+def legacy_categorize(category_keywords, title: str, summary: str = "") -> ArticleCategory:
+    text_content = (title + " " + summary).lower()
+    scores = {category: 0 for category in ArticleCategory}
+    for category, keywords in category_keywords.items():
+        for keyword in keywords:
+            if keyword in text_content:
+                scores[category] += 1
+    if max(scores.values()) > 0:
+        return max(scores, key=scores.get)
+    return ArticleCategory.GENERAL
+
+def scaled_keywords(factor: int, seed: int = 7):
+    rng = random.Random(seed)
+    alphabet = "абвгдежзиклмнопрстуфхцчшэюя"
+    category_keywords = {category: list(keywords) for category, keywords in DEFAULT_CATEGORY_KEYWORDS.items()}
+    for keywords in category_keywords.values():
+        for _ in range(len(keywords) * (factor - 1)):
+            keywords.append("".join(rng.choice(alphabet) for _ in range(rng.randint(5, 12))))
+    return category_keywords
+
+def make_corpus(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    keywords = [keyword for keywords in DEFAULT_CATEGORY_KEYWORDS.values() for keyword in keywords]
+    corpus = []
+    for _ in range(size):
+        title = " ".join(rng.choice(FILLER_WORDS + keywords[:rng.randint(0, len(keywords))]) for _ in range(8))
+        summary = " ".join(rng.choice(FILLER_WORDS + keywords) for _ in range(30))
+        corpus.append((title, summary))
+    return corpus
+
+def measure(func, corpus) -> float:
+    started = time.perf_counter()
+    func(corpus)
+    return len(corpus) / (time.perf_counter() - started)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Bulk categorization microbenchmark")
+    arg_parser.add_argument("--size", type=int, default=100000, help="number of synthetic articles")
+    arg_parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                            help="dictionary size multipliers to benchmark")
+    args = arg_parser.parse_args()
+
+    corpus = make_corpus(args.size)
+    print(f"{'keywords':>8} {'legacy, art/s':>15} {'compiled, art/s':>16} {'batch, art/s':>13} {'speedup':>8}")
+    for scale in args.scales:
+        category_keywords = scaled_keywords(scale)
+        categorizer = KeywordCategorizer(category_keywords)
+        legacy = measure(lambda items: [legacy_categorize(category_keywords, t, s) for t, s in items], corpus)
+        compiled = measure(categorizer.categorize_many, corpus)
+        model = HashedLinearModel.from_keyword_categorizer(categorizer)
+        batch = measure(lambda items: model.predict([f"{t} {s}" for t, s in items]), corpus)
+        keywords_count = sum(len(keywords) for keywords in category_keywords.values())
+        print(f"{keywords_count:>8} {legacy:>15,.0f} {compiled:>16,.0f} {batch:>13,.0f} "
+              f"{max(compiled, batch) / legacy:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
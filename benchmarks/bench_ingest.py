@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import aiohttp
+from multidict import CIMultiDict
+from sqlalchemy import select
+from yarl import URL
+
+from app import crud, fetch_metrics, rss_parser
+from app.database import AsyncSessionLocal, init_models
+from app.http_client import HTTPClient
+from app.models import NewsSource
+
+INDEX_FILE = "index.jsonl"
+
+async def capture(corpus_dir: str, urls: List[str]) -> int:
+    os.makedirs(corpus_dir, exist_ok=True)
+    if not urls:
+        async with AsyncSessionLocal() as db:
+            urls = [source.url for source in await crud.get_active_news_sources(db)]
+
+    http = HTTPClient()
+    session = await http.get_session()
+    captured = 0
+    try:
+        with open(os.path.join(corpus_dir, INDEX_FILE), "a", encoding="utf-8") as index_file:
+            for url in urls:
+                try:
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                        body = await http.read_body(response)
+                        status, headers = response.status, dict(response.headers)
+                except Exception as e:
+                    print(f"Error capturing {url}: {e}")
+                    continue
+
+                fetched_at = datetime.now(timezone.utc)
+                file_name = f"{hashlib.sha1(url.encode()).hexdigest()[:12]}-{fetched_at:%Y%m%dT%H%M%S%f}.gz"
+                with gzip.open(os.path.join(corpus_dir, file_name), "wb") as body_file:
+                    body_file.write(body)
+                index_file.write(json.dumps({
+                    'url': url,
+                    'status': status,
+                    'headers': headers,
+                    'file': file_name,
+                    'fetched_at': fetched_at.isoformat()
+                }, ensure_ascii=False) + "\n")
+                captured += 1
+                print(f"Captured {url}: {status}, {len(body)} bytes")
+    finally:
+        await http.close()
+    return captured
+
+def load_corpus(corpus_dir: str) -> List[Dict]:
+    captures = []
+    with open(os.path.join(corpus_dir, INDEX_FILE), encoding="utf-8") as index_file:
+        for line in index_file:
+            entry = json.loads(line)
+            with gzip.open(os.path.join(corpus_dir, entry['file']), "rb") as body_file:
+                entry['body'] = body_file.read()
+            captures.append(entry)
+    return captures
+
+class ReplayContent:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, chunk_size: int):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+class ReplayResponse:
+    def __init__(self, capture: Dict):
+        self.url = URL(capture['url'])
+        self.status = capture['status']
+        self.headers = CIMultiDict(capture['headers'])
+        self.content_length = len(capture['body'])
+        self.content = ReplayContent(capture['body'])
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            request_info = aiohttp.RequestInfo(self.url, "GET", CIMultiDict(), self.url)
+            raise aiohttp.ClientResponseError(request_info, (), status=self.status, message="replayed error")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class ReplaySession:
+    """Serves captured responses in capture order per URL; validators are ignored."""
+
+    def __init__(self, captures: List[Dict]):
+        self.captures = defaultdict(deque)
+        for capture in captures:
+            self.captures[capture['url']].append(capture)
+        self.closed = False
+
+    def get(self, url: str, **kwargs) -> ReplayResponse:
+        queue = self.captures[url]
+        queue.rotate(-1)
+        return ReplayResponse(queue[-1])
+
+    async def close(self):
+        self.closed = True
+
+def replay_parser(captures: List[Dict], parse_workers: int, stream: bool) -> rss_parser.RSSParser:
+    parser = rss_parser.RSSParser(parse_workers=parse_workers, stream=stream)
+    parser.http.session = ReplaySession(captures)
+    return parser
+
+async def get_replay_sources(urls) -> Dict[str, NewsSource]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(NewsSource).where(NewsSource.url.in_(urls)))
+        sources = {source.url: source for source in result.scalars()}
+        for url in urls:
+            if url not in sources:
+                sources[url] = NewsSource(name=urlparse(url).hostname or url, url=url)
+                db.add(sources[url])
+        await db.commit()
+        for source in sources.values():
+            await db.refresh(source)
+    return sources
+
+async def replay(corpus_dir: str, mode: str, repeat: int, parse_workers: int, stream: bool):
+    captures = load_corpus(corpus_dir)
+    parser = replay_parser(captures, parse_workers, stream)
+    sources = {}
+    if mode == "save":
+        await init_models()
+        sources = await get_replay_sources({capture['url'] for capture in captures})
+
+    totals = defaultdict(float)
+    started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        for _ in range(repeat):
+            for source in sources.values():
+                source.etag = source.last_modified = source.last_entry_id = source.last_published_at = None
+                source.content_hash = source.parser = None
+            for capture in captures:
+                totals['bytes'] += len(capture['body'])
+                if mode == "parse":
+                    totals['entries'] += len(await parser.parse_feed(capture['url']))
+                    continue
+                async with AsyncSessionLocal() as db:
+                    await parser.parse_and_save_articles(db, sources[capture['url']])
+                metrics = fetch_metrics.window[-1]
+                for field in ('entries', 'new_items', 'duplicates', 'parse_ms', 'categorize_ms', 'db_ms'):
+                    totals[field] += metrics[field]
+    finally:
+        await parser.close()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+    entries = int(totals['entries'])
+    print(f"Replayed {len(captures) * repeat} responses ({totals['bytes'] / 1e6:.1f} MB) in {elapsed:.2f}s")
+    print(f"Entries: {entries}, {entries / elapsed:,.0f} entries/s")
+    print(f"CPU time: {cpu:.2f}s ({cpu / max(entries, 1) * 1e6:.0f} us/entry)"
+          + (", excluding parse workers" if parse_workers else ""))
+    if mode == "save":
+        db_seconds = totals['db_ms'] / 1000
+        print(f"Parse {totals['parse_ms'] / 1000:.2f}s, categorize {totals['categorize_ms'] / 1000:.2f}s, "
+              f"DB {db_seconds:.2f}s")
+        print(f"New {int(totals['new_items'])}, duplicates {int(totals['duplicates'])}, "
+              f"DB write throughput {entries / db_seconds if db_seconds else 0:,.0f} entries/s")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Capture feed responses and replay ingestion offline")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = commands.add_parser("capture", help="fetch feeds and store raw responses")
+    capture_parser.add_argument("--corpus", required=True, help="corpus directory")
+    capture_parser.add_argument("urls", nargs="*", help="feed URLs, all active sources by default")
+
+    replay_parser_args = commands.add_parser("replay", help="run ingestion against a stored corpus")
+    replay_parser_args.add_argument("--corpus", required=True, help="corpus directory")
+    replay_parser_args.add_argument("--mode", choices=["parse", "save"], default="parse",
+                                    help="parse_feed only, or the full parse_and_save_articles path "
+                                         "into DATABASE_URL (use a scratch database)")
+    replay_parser_args.add_argument("--repeat", type=int, default=1)
+    replay_parser_args.add_argument("--parse-workers", type=int, default=0,
+                                    help="0 parses inline so CPU time covers all work")
+    replay_parser_args.add_argument("--stream", action="store_true", help="use the streaming parser in save mode")
+    args = arg_parser.parse_args()
+
+    if args.command == "capture":
+        asyncio.run(capture(args.corpus, args.urls))
+    else:
+        asyncio.run(replay(args.corpus, args.mode, args.repeat, args.parse_workers, args.stream))
+
+if __name__ == "__main__":
+    main()